@@ -3,6 +3,11 @@ try:
 except ImportError as e:
     print("Warning:", e)
 
+try:
+    from .mjpeg import *
+except ImportError as e:
+    print("Warning:", e)
+
 try:
     from .gym import *
 except ImportError as e:
@@ -1,6 +1,8 @@
 from xvfbwrapper import Xvfb
 import gym
 from typing import List, Any
+from utils import Frame, as_captures
+import time
 
 
 class GymCapture:
@@ -9,12 +11,15 @@ class GymCapture:
         self.env = gym.make(name)
         self.vdisplay = Xvfb()
         self.counter = 0
+        self.seq = 0
         self.prev = None
         self.next = None
 
     def __call__(self, captures: List[Any]) -> List[Any]:
+        captures = as_captures(captures)
         image = self.next_step()
-        captures.append(image)
+        self.seq += 1
+        captures.append(Frame(image, timestamp=time.time(), seq=self.seq, source=self.name))
         return captures
 
     def next_step(self):
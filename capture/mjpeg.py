@@ -0,0 +1,214 @@
+from typing import List, Any
+from threading import Thread, Condition
+from urllib.parse import urlsplit
+import http.client
+import cv2
+import numpy as np
+from utils import maintain_aspect_ratio_resize, Frame, as_captures
+import time
+
+
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+REDUCED_FLAGS = [(8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)]
+
+
+def jpeg_size(data: bytes):
+    """
+    Read the width and height from the SOF segment of a jpg without decoding it.
+
+    :return: (width, height) or None if there is no SOF segment.
+    """
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in SOF_MARKERS:
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height
+        if marker == 0xFF:
+            i += 1
+        elif marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            i += 2
+        else:
+            i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+def decode_jpeg(data: bytes, width=None):
+    """
+    Decode a jpg to the given width. The jpg is decoded at 1/2, 1/4 or 1/8 of its size if that is still at least
+        width pixels wide, which is much cheaper than a full size decode followed by a resize.
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    flag = cv2.IMREAD_COLOR
+    size = jpeg_size(data) if width is not None else None
+    if size is not None:
+        for factor, reduced_flag in REDUCED_FLAGS:
+            if size[0] // factor >= width:
+                flag = reduced_flag
+                break
+    image = cv2.imdecode(buffer, flag)
+    if image is not None and width is not None and image.shape[1] != width:
+        image = maintain_aspect_ratio_resize(image, width=width)
+    return image
+
+
+class MJPEGHTTPCapture:
+    def __init__(self, url: str, width=1024, flip_h: bool = False, timeout=5.0, poll_interval=0.1):
+        """
+        Reads an MJPEG (multipart/x-mixed-replace) stream, or polls a url that returns a single jpg, over a
+            persistent keep-alive connection. A background thread only keeps the newest jpg, and a jpg is only
+            decoded when it is returned by __call__, at a reduced resolution when possible.
+
+        :param url: The url of the stream (e.g. http://10.0.0.124:81/stream) or of a single jpg (e.g. .../capture).
+        :param width: The width of the decoded frames or None for the original size.
+        :param flip_h: Rotate the frames by 180 degrees.
+        :param timeout: The socket timeout in seconds.
+        :param poll_interval: The minimum time in seconds between two requests for a single jpg, so the camera is
+            not flooded with back to back requests (not used for MJPEG streams).
+        """
+        self.url = url
+        self.width = width
+        self.flip_h = flip_h
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.connection = None
+
+        self.condition = Condition()
+        self.jpg = None
+        self.jpg_seq = 0
+        self.jpg_timestamp = None
+        self.frame = None
+        self.received = 0
+        self.decoded = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self.terminate = False
+        self.thread = Thread(target=self.update, args=())
+        self.thread.daemon = True
+
+        self.prev = None
+        self.next = None
+
+    def __call__(self, captures: List[Any]) -> List[Any]:
+        captures = as_captures(captures)
+        with self.condition:
+            self.condition.wait_for(lambda: self.jpg is not None or self.terminate)
+            jpg, seq, timestamp = self.jpg, self.jpg_seq, self.jpg_timestamp
+
+        if jpg is not None and (self.frame is None or self.frame.seq != seq):
+            image = decode_jpeg(jpg, self.width)
+            if image is not None and self.flip_h:
+                image = cv2.flip(image, -1)
+            if self.frame is not None:
+                self.dropped += seq - self.frame.seq - 1
+            self.decoded += 1
+            self.frame = Frame(image, timestamp=timestamp, seq=seq, source=self.url)
+        captures.append(self.frame)
+        return captures
+
+    def connect(self):
+        url = urlsplit(self.url)
+        self.connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=self.timeout)
+        path = url.path or "/"
+        if url.query:
+            path += "?" + url.query
+        return path
+
+    def publish(self, jpg):
+        with self.condition:
+            self.jpg = jpg
+            self.jpg_seq += 1
+            self.jpg_timestamp = time.time()
+            self.received += 1
+            self.condition.notify_all()
+
+    def read_multipart(self, response, boundary):
+        marker = b"--" + boundary.lstrip(b"-")
+        while not self.terminate:
+            line = response.readline()
+            if not line:
+                raise ConnectionError("Stream closed")
+            if not line.strip().startswith(marker):
+                continue
+            length = None
+            while True:
+                line = response.readline()
+                if not line:
+                    raise ConnectionError("Stream closed")
+                if line in (b"\r\n", b"\n"):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                if key.strip().lower() == "content-length":
+                    length = int(value)
+            if length is not None:
+                self.publish(response.read(length))
+            else:
+                # No content length, read until the end of the jpg
+                data = b""
+                while not data.rstrip(b"\r\n").endswith(b"\xff\xd9"):
+                    line = response.readline()
+                    if not line:
+                        raise ConnectionError("Stream closed")
+                    data += line
+                self.publish(data.rstrip(b"\r\n"))
+
+    def update(self):
+        while not self.terminate:
+            try:
+                path = self.connect()
+                while not self.terminate:
+                    request_time = time.time()
+                    self.connection.request("GET", path, headers={"Connection": "keep-alive"})
+                    response = self.connection.getresponse()
+                    if not 200 <= response.status < 300:
+                        # E.g. a camera that is still booting, do not publish the error page as a jpg
+                        response.read()
+                        raise ConnectionError(f"HTTP {response.status} {response.reason}")
+                    content_type = response.getheader("Content-Type", "")
+                    if content_type.startswith("multipart/"):
+                        boundary = content_type.partition("boundary=")[2].strip().strip('"')
+                        self.read_multipart(response, boundary.encode("latin-1"))
+                    else:
+                        # Single jpg per request, reuse the connection for the next one
+                        self.publish(response.read())
+                        with self.condition:
+                            self.condition.wait_for(lambda: self.terminate,
+                                                    max(request_time + self.poll_interval - time.time(), 0))
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                if not self.terminate:
+                    print(f"Re-initialize {self.url}: {e}")
+                    self.reconnects += 1
+                    time.sleep(0.5)
+            finally:
+                if self.connection is not None:
+                    self.connection.close()
+        print(f"Stopped thread {self.__class__} {id(self)}")
+
+    def stats(self):
+        """
+        :return: The number of received jpgs, decoded frames, jpgs that were never decoded, reconnects and the age in
+            seconds of the newest jpg.
+        """
+        with self.condition:
+            age = time.time() - self.jpg_timestamp if self.jpg_timestamp is not None else None
+            return {"received": self.received, "decoded": self.decoded, "dropped": self.dropped,
+                    "reconnects": self.reconnects, "age": age}
+
+    def start(self, block: bool = False):
+        if not self.thread.is_alive():
+            self.thread.start()
+        if block:
+            self.wait()
+
+    def stop(self):
+        with self.condition:
+            self.terminate = True
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout=timeout)
+        return self.thread.is_alive()
@@ -1,26 +1,78 @@
 from typing import Union
+from threading import Thread, Condition
 import cv2
-from utils import maintain_aspect_ratio_resize
+from utils import maintain_aspect_ratio_resize, Frame, as_captures
 from typing import List, Any
+import time
 
 
 class OpenCVCapture:
-    def __init__(self, src: Union[int, str] = 0, flip_h: bool = False):
+    def __init__(self, src: Union[int, str] = 0, flip_h: bool = False, threaded: bool = False):
+        """
+        :param src: The camera index or the url of the stream.
+        :param flip_h: Rotate the frames by 180 degrees.
+        :param threaded: Read the source continuously on a background thread and only keep the newest frame. This
+            prevents network streams from buffering up old frames when the pipeline is slower than the source.
+        """
         self.src = src
         self.capture = cv2.VideoCapture(src)
         self.prev = None
         self.next = None
         self.flip_h = flip_h
+        self.seq = 0
+
+        self.threaded = threaded
+        self.condition = Condition()
+        self.frame = None
+        self.output = None
+        self.grabbed = 0
+        self.dropped = 0
+        self.consumed_seq = 0
+        self.terminate = False
+        self.thread = Thread(target=self.update, args=())
+        self.thread.daemon = True
 
     def __del__(self):
         self.capture.release()
 
     def __call__(self, captures: List[Any]) -> List[Any]:
-        frame = self.get_frame()
-        captures.append(frame)
+        captures = as_captures(captures)
+        if self.threaded:
+            with self.condition:
+                # Block until the first frame is grabbed, then always return the newest frame
+                self.condition.wait_for(lambda: self.frame is not None or self.terminate)
+                frame = self.frame
+                if frame is not None:
+                    self.consumed_seq = frame.seq
+                output = self.output
+            if frame is None:
+                captures.append(None)
+            elif output is not None and output[0] is frame:
+                # Called again before a new frame was grabbed, the frame is already processed
+                captures.append(output[1])
+            else:
+                # Only the frames that are returned are processed, the grabber thread drops the others unprocessed
+                output = (frame, frame.derive(self.process(frame.image)))
+                self.output = output
+                captures.append(output[1])
+        else:
+            frame = self.process(self.get_frame())
+            self.seq += 1
+            captures.append(Frame(frame, timestamp=time.time(), seq=self.seq, source=self.src))
         return captures
 
+    def process(self, frame):
+        if frame is None:
+            return None
+        frame = maintain_aspect_ratio_resize(frame, width=1024)
+        if self.flip_h:
+            frame = cv2.flip(frame, -1)
+        return frame
+
     def get_frame(self):
+        """
+        :return: The next unprocessed frame of the source or None if it is not opened or the capture is stopped.
+        """
         if not self.capture.isOpened():
             return None
 
@@ -28,22 +80,53 @@ class OpenCVCapture:
         frame = None
 
         while not success:
+            if self.terminate:
+                return None
             success, frame = self.capture.read()
-            if success:
-                frame = maintain_aspect_ratio_resize(frame, width=1024)
-            else:
+            if not success:
                 print("Re-initialize video capture device.")
                 del self.capture
                 self.capture = cv2.VideoCapture(self.src)
-        if self.flip_h:
-            frame = cv2.flip(frame, -1)
         return frame
 
+    def update(self):
+        while not self.terminate:
+            image = self.get_frame()
+            if image is None:
+                time.sleep(0.1)
+                continue
+            with self.condition:
+                if self.frame is not None and self.frame.seq != self.consumed_seq:
+                    # The previous frame was never returned
+                    self.dropped += 1
+                self.seq += 1
+                self.grabbed += 1
+                self.frame = Frame(image, timestamp=time.time(), seq=self.seq, source=self.src)
+                self.condition.notify_all()
+        print(f"Stopped thread {self.__class__} {id(self)}")
+
+    def stats(self):
+        """
+        :return: The number of grabbed frames, the number of frames that were replaced before they were returned and
+            the age in seconds of the newest frame (threaded only).
+        """
+        with self.condition:
+            age = self.frame.age() if self.frame is not None else None
+            return {"grabbed": self.grabbed, "dropped": self.dropped, "age": age}
+
     def start(self, block: bool = False):
-        return
+        if self.threaded and not self.thread.is_alive():
+            self.thread.start()
+        if block:
+            self.wait()
 
     def stop(self):
-        return
+        with self.condition:
+            self.terminate = True
+            self.condition.notify_all()
 
     def wait(self, timeout=None):
+        if self.threaded and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+            return self.thread.is_alive()
         return False
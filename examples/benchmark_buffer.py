@@ -0,0 +1,88 @@
+import pickle
+import time
+import numpy as np
+from utils import Buffer
+
+
+class Invert:
+    """
+    Stand-in for a model element: appends one new image of the same size as the input.
+    """
+    def __call__(self, captures):
+        captures.append(255 - captures[-1])
+        return captures
+
+    def start(self, block: bool = False):
+        return
+
+    def stop(self):
+        return
+
+    def wait(self, timeout=3):
+        return False
+
+
+def run(transport, captures, duration=5.0):
+    buffer = Buffer(Invert, use_mp=True, transport=transport)
+    buffer.start()
+    frames = 0
+    last = None
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        output = buffer(captures)
+        if output[-1] is not last:
+            last = output[-1]
+            frames += 1
+        time.sleep(0.0005)
+    elapsed = time.perf_counter() - start
+
+    if transport == "shm":
+        # Parent side: copy into the input slots and out of the output slots, the child writes the output slots
+        bytes_copied = buffer.input_pool.bytes_copied + 2 * buffer.output_pool.bytes_copied
+    else:
+        # Pickling and unpickling in both directions
+        bytes_copied = 2 * frames * (len(pickle.dumps(captures)) + len(pickle.dumps(Invert()(captures.copy()))))
+    buffer.stop()
+    buffer.wait(timeout=1)
+    return frames / elapsed, bytes_copied / max(frames, 1)
+
+
+def handoff_latency(captures, iterations=1000):
+    buffer = Buffer(Invert(), use_mp=False)
+    buffer.start()
+    version = 0
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        buffer(captures)
+        version = buffer.wait_for_update(version)
+        latencies.append(time.perf_counter() - start)
+    buffer.stop()
+    buffer.wait(timeout=1)
+    return np.median(latencies)
+
+
+def idle_cpu(num_buffers=12, duration=2.0):
+    buffers = [Buffer(Invert(), use_mp=False) for _ in range(num_buffers)]
+    for buffer in buffers:
+        buffer.start()
+    start = time.process_time()
+    time.sleep(duration)
+    cpu = (time.process_time() - start) / duration
+    for buffer in buffers:
+        buffer.stop()
+    return cpu
+
+
+def benchmark(width=1024, height=768, num_images=3):
+    captures = [np.random.randint(0, 255, [height, width, 3], dtype=np.uint8) for _ in range(num_images)]
+    for transport in ["pickle", "shm"]:
+        fps, bytes_per_frame = run(transport, captures)
+        print(f"{transport:>6}: {fps:8.1f} frames/s {bytes_per_frame / 1e6:8.2f} MB copied/frame")
+    small = [np.zeros([8, 8, 3], dtype=np.uint8)]
+    print(f"handoff latency: {handoff_latency(small) * 1e6:8.1f} us (median)")
+    print(f"idle cpu of 12 buffers: {idle_cpu() * 100:8.1f} % of a core")
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,53 @@
+import time
+import tracemalloc
+import numpy as np
+from utils import Captures, Frame, SBS, Inlay, resize_cache
+
+
+def create_captures(width=1280, height=720, count=2, seed=0):
+    """
+    Captures with count new random frames, like the output of a capture and a processor.
+    """
+    rng = np.random.default_rng(seed)
+    return Captures([Frame(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), seq=i) for i in range(count)])
+
+
+def measure(name, element, iterations=100):
+    images = [list(create_captures(seed=i)) for i in range(4)]
+    # Warm up, the canvas pool holds the last output and one free canvas
+    element(Captures(images[0]))
+    element(Captures(images[1]))
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    for i in range(iterations):
+        # New frames every call, so neither the element nor the resize cache can return an earlier result
+        element(Captures(images[i % len(images)]))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>30}: {elapsed / iterations * 1e3:6.2f} ms per frame, peak {peak / 2 ** 20:6.1f} MiB allocated")
+
+
+def benchmark():
+    """
+    Numpy allocations are traced, the intermediate images that OpenCV allocates itself are not, so the peak of the
+        reused canvases mostly shows that no new canvas is allocated per frame.
+    """
+    for reuse_canvas in (False, True):
+        suffix = "reused" if reuse_canvas else "new"
+        measure(f"SBS ({suffix} canvas)", SBS(-1, -2, factor=1, reuse_canvas=reuse_canvas))
+        measure(f"SBS factor 2 ({suffix} canvas)", SBS(-1, -2, factor=2, reuse_canvas=reuse_canvas))
+        measure(f"Inlay ({suffix} canvas)", Inlay(-1, -2, reuse_canvas=reuse_canvas))
+
+    # Four Inlays that paste the same camera frame into different outputs, like the pipelines in webcams.py
+    inlays = [Inlay(-1, -2) for _ in range(4)]
+    for max_bytes in (0, resize_cache.max_bytes):
+        resize_cache.max_bytes = max_bytes
+        measure(f"4x Inlay (resize cache {'on' if max_bytes else 'off'})",
+                lambda captures: [inlay(Captures(captures.frames[:1] + [Frame(captures[1])])) for inlay in inlays])
+    print("resize cache:", resize_cache.stats())
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,111 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+import time
+import cv2
+import numpy as np
+from capture import MJPEGHTTPCapture, OpenCVCapture, decode_jpeg
+from utils import maintain_aspect_ratio_resize
+
+C_PORT = 5081
+
+
+def create_jpgs(width=2048, height=1536, count=30):
+    """
+    QXGA frames, the largest frame size of an ESP32 camera with an OV3660 sensor.
+    """
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    image = np.stack(np.broadcast_arrays(x[None, :], y[:, None], (x[None, :] + y[:, None]) / 2), axis=2)
+    image = image.astype(np.uint8)
+    jpgs = []
+    for i in range(count):
+        image = np.roll(image, 16, axis=1)
+        jpgs.append(cv2.imencode('.jpg', image)[1].tobytes())
+    return jpgs
+
+
+class StandInCamera(BaseHTTPRequestHandler):
+    """
+    Local stand-in for an ESP32 camera: /stream serves multipart MJPEG at fps, /capture serves a single jpg.
+    """
+    protocol_version = "HTTP/1.1"
+    jpgs = []
+    fps = 30
+
+    def do_GET(self):
+        if self.path == "/capture":
+            jpg = self.jpgs[int(time.time() * self.fps) % len(self.jpgs)]
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(jpg)))
+            self.end_headers()
+            self.wfile.write(jpg)
+        elif self.path == "/stream":
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace;boundary=123456789000000000000987654321")
+            self.end_headers()
+            try:
+                i = 0
+                while True:
+                    jpg = self.jpgs[i % len(self.jpgs)]
+                    self.wfile.write(b"--123456789000000000000987654321\r\n"
+                                     b"Content-Type: image/jpeg\r\n" +
+                                     f"Content-Length: {len(jpg)}\r\n\r\n".encode() + jpg + b"\r\n")
+                    i += 1
+                    time.sleep(1.0 / self.fps)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        return
+
+
+def benchmark_decode(jpgs, width=1024, iterations=100):
+    start = time.process_time()
+    for i in range(iterations):
+        image = cv2.imdecode(np.frombuffer(jpgs[i % len(jpgs)], dtype=np.uint8), cv2.IMREAD_COLOR)
+        maintain_aspect_ratio_resize(image, width=width)
+    full = (time.process_time() - start) / iterations
+    start = time.process_time()
+    for i in range(iterations):
+        decode_jpeg(jpgs[i % len(jpgs)], width=width)
+    reduced = (time.process_time() - start) / iterations
+    print(f"decode to width {width}: full decode + resize {full * 1e3:.1f} ms, reduced decode {reduced * 1e3:.1f} ms")
+
+
+def benchmark_capture(name, capture, consumer_fps=10, duration=5.0):
+    """
+    Pull frames at the rate of a slow pipeline and report the cpu time per returned frame.
+    """
+    capture.start()
+    capture([])
+    frames = 0
+    cpu = time.process_time()
+    start = time.time()
+    while time.time() - start < duration:
+        capture([])
+        frames += 1
+        time.sleep(1.0 / consumer_fps)
+    cpu = time.process_time() - cpu
+    print(f"{name:>20}: {cpu / frames * 1e3:6.1f} ms cpu per returned frame")
+    capture.stop()
+    capture.wait(timeout=2)
+
+
+def benchmark():
+    StandInCamera.jpgs = create_jpgs()
+    server = ThreadingHTTPServer(("localhost", C_PORT), StandInCamera)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    benchmark_decode(StandInCamera.jpgs)
+    stream = f"http://localhost:{C_PORT}/stream"
+    benchmark_capture("MJPEGHTTPCapture", MJPEGHTTPCapture(stream))
+    benchmark_capture("OpenCVCapture", OpenCVCapture(stream))
+    benchmark_capture("OpenCVCapture threaded", OpenCVCapture(stream, threaded=True))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,71 @@
+import glob
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+C_MODEL = "yolov8n.onnx"
+C_DTRON_MODEL = "COCO-Detection/faster_rcnn_R_50_FPN_3x.yaml"
+
+
+def load_frames(path=None, count=50, width=1024):
+    """
+    Recorded frames from a video file or a directory of jpgs, or synthetic frames if no path is given.
+    """
+    frames = []
+    if path is not None and os.path.isdir(path):
+        for fn in sorted(glob.glob(os.path.join(path, "*.jpg")))[:count]:
+            frames.append(cv2.imread(fn))
+    elif path is not None:
+        cap = cv2.VideoCapture(path)
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    else:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 255, (768, 1024, 3), dtype=np.uint8) for _ in range(count)]
+    return [cv2.resize(f, (width, f.shape[0] * width // f.shape[1])) if f.shape[1] != width else f for f in frames]
+
+
+def measure(name, element, frames):
+    element.detect(frames[0])
+    start = time.perf_counter()
+    cpu = time.process_time()
+    detections = 0
+    for frame in frames:
+        detections += len(element.detect(frame))
+    elapsed = (time.perf_counter() - start) / len(frames)
+    cpu = (time.process_time() - cpu) / len(frames)
+    print(f"{name:>40}: {elapsed * 1e3:7.1f} ms per frame, {cpu * 1e3:7.1f} ms cpu, "
+          f"{detections / len(frames):.1f} detections per frame")
+
+
+def benchmark(model_path=C_MODEL, frames_path=None):
+    frames = load_frames(frames_path)
+    cores = os.cpu_count()
+
+    try:
+        from processors.onnx_detector import OnnxDetector
+        for intra, inter in [(1, 0), (cores // 2, 0), (cores, 0), (cores // 2, 2)]:
+            detector = OnnxDetector(model_path, intra_op_threads=intra, inter_op_threads=inter)
+            measure(f"OnnxDetector intra={intra} inter={inter}", detector, frames)
+            detector.stop()
+    except ImportError as e:
+        print("Skip OnnxDetector:", e)
+
+    try:
+        from processors.detectron2 import Detectron2
+        detector = Detectron2(Detectron2.create_config(C_DTRON_MODEL, C_DTRON_MODEL, dev="cpu"))
+        measure("Detectron2 cpu", detector, frames)
+        detector.stop()
+    except ImportError as e:
+        print("Skip Detectron2:", e)
+
+
+if __name__ == '__main__':
+    # e.g. python benchmark_onnx.py yolov8n.onnx recording.mp4
+    benchmark(*sys.argv[1:3])
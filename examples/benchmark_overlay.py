@@ -0,0 +1,64 @@
+import time
+import numpy as np
+from processors.overlay import draw_detections
+
+
+def create_detections(width=1024, height=768, count=10, seed=0):
+    """
+    Random boxes with an elliptic mask inside each box.
+    """
+    rng = np.random.default_rng(seed)
+    x1 = rng.uniform(0, width * 0.7, count)
+    y1 = rng.uniform(0, height * 0.7, count)
+    boxes = np.stack([x1, y1, x1 + rng.uniform(40, width * 0.3, count), y1 + rng.uniform(40, height * 0.3, count)],
+                     axis=1).astype(np.float32)
+    scores = rng.uniform(0.5, 1.0, count).astype(np.float32)
+    classes = rng.integers(0, 80, count)
+    yy, xx = np.mgrid[0:height, 0:width]
+    cx, cy = (boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2
+    rx, ry = (boxes[:, 2] - boxes[:, 0]) / 2, (boxes[:, 3] - boxes[:, 1]) / 2
+    masks = ((xx[None] - cx[:, None, None]) / rx[:, None, None]) ** 2 + \
+            ((yy[None] - cy[:, None, None]) / ry[:, None, None]) ** 2 <= 1
+    image = np.random.default_rng(seed).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return image, boxes, scores, classes, masks
+
+
+def measure(name, draw, iterations=20):
+    draw()
+    start = time.perf_counter()
+    for i in range(iterations):
+        draw()
+    print(f"{name:>30}: {(time.perf_counter() - start) / iterations * 1e3:6.1f} ms per frame")
+
+
+def benchmark():
+    image, boxes, scores, classes, masks = create_detections()
+    class_names = [f"class{i}" for i in range(80)]
+    measure("draw_detections", lambda: draw_detections(image, boxes, scores, classes, masks, class_names))
+    measure("draw_detections (no masks)", lambda: draw_detections(image, boxes, scores, classes, None, class_names))
+
+    try:
+        import torch
+        from detectron2.structures import Instances, Boxes
+        from detectron2.utils.visualizer import Visualizer
+        instances = Instances(image.shape[:2], pred_boxes=Boxes(torch.as_tensor(boxes)),
+                              scores=torch.as_tensor(scores), pred_classes=torch.as_tensor(classes),
+                              pred_masks=torch.as_tensor(masks))
+        metadata = type("Metadata", (), {"thing_classes": class_names, "get": lambda self, key, default=None:
+                                         getattr(self, key, default)})()
+        measure("detectron2 Visualizer", lambda: Visualizer(image[:, :, ::-1], metadata, scale=1)
+                .draw_instance_predictions(instances).get_image())
+    except ImportError as e:
+        print("Skip detectron2 Visualizer:", e)
+
+    try:
+        from mmdet.core.visualization import imshow_det_bboxes
+        bboxes = np.concatenate([boxes, scores[:, None]], axis=1)
+        measure("mmdet show_result", lambda: imshow_det_bboxes(image.copy(), bboxes, classes, masks,
+                                                               class_names=class_names, show=False))
+    except ImportError as e:
+        print("Skip mmdet show_result:", e)
+
+
+if __name__ == '__main__':
+    benchmark()
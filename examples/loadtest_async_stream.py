@@ -0,0 +1,67 @@
+from threading import Thread
+import asyncio
+import time
+import numpy as np
+from utils import Frame
+from viewers import FlaskViewer, AsyncStreamServer
+
+C_PORT = 5055
+
+
+def feed(viewer, fps=30, duration=12.0):
+    """
+    Push a new synthetic 1024x768 frame into the viewer at a fixed rate.
+    """
+    x = np.linspace(0, 255, 1024, dtype=np.float32)
+    y = np.linspace(0, 255, 768, dtype=np.float32)
+    image = np.stack(np.broadcast_arrays(x[None, :], y[:, None], (x[None, :] + y[:, None]) / 2), axis=2)
+    image = image.astype(np.uint8)
+    start = time.time()
+    while time.time() - start < duration:
+        image = np.roll(image, 8, axis=1)
+        viewer([Frame(image, timestamp=time.time())])
+        time.sleep(1.0 / fps)
+
+
+async def client(url, duration, counts, idx):
+    reader, writer = await asyncio.open_connection("localhost", C_PORT)
+    writer.write(f"GET {url} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    tail = b""
+    start = time.time()
+    while time.time() - start < duration:
+        chunk = await reader.read(1 << 16)
+        if not chunk:
+            break
+        data = tail + chunk
+        counts[idx] += data.count(b"--frame\r\n")
+        tail = data[-9:]
+    writer.close()
+
+
+async def clients(num_clients, duration):
+    counts = [0] * num_clients
+    urls = ["/stream", "/stream?w=512&q=60", "/stream?w=256&q=40"]
+    await asyncio.gather(*[client(urls[i % len(urls)], duration, counts, i) for i in range(num_clients)])
+    return counts
+
+
+def loadtest(num_clients=300, duration=10.0):
+    server = AsyncStreamServer(port=C_PORT)
+    viewer = FlaskViewer(server)
+    server.start()
+    Thread(target=feed, args=(viewer,), daemon=True).start()
+
+    cpu = time.process_time()
+    counts = asyncio.run(clients(num_clients, duration))
+    cpu = (time.process_time() - cpu) / duration
+    fps = np.array(counts) / duration
+
+    print(f"clients: {num_clients} frames/s per client: mean {fps.mean():.1f} min {fps.min():.1f} max {fps.max():.1f}")
+    print(f"server: {viewer.broadcaster.stats()} cpu: {cpu * 100:.1f}% of a core (server and clients)")
+    server.stop()
+    print(f"stopped: {not server.wait(timeout=5)}")
+
+
+if __name__ == '__main__':
+    loadtest()
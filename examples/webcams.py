@@ -1,8 +1,8 @@
-from processors import Detectron2, MMDetect
+from processors import Detectron2, MMDetect, InferenceServer
 from viewers import FlaskServer, FlaskViewer
 from capture import OpenCVCapture
 from pipelines import LinkedListPipeline
-from utils import Inlay, Buffer, SBS, Merge, Buffer
+from utils import Inlay, Buffer, SBS, Tee, Grid
 
 C_STREAM_1 = 'http://10.0.0.124:81/stream'
 C_STREAM_2 = 'http://10.0.0.126:81/stream'
@@ -52,7 +52,7 @@ def big_brother():
     def get_pipeline(capture_element, model_element, flask_server, url):
         p = LinkedListPipeline()
         p.add(capture_element)
-        p.add(Buffer(model_element, use_mp=True))
+        p.add(Buffer(model_element, use_mp=False))  # the model runs in the InferenceServer process
         inlay = Inlay(factor=4)
         p.add(inlay)
         p.add(FlaskViewer(flask_server, stream_url=url, stream_name=url))
@@ -60,14 +60,10 @@ def big_brother():
 
     def create_4x4_overview(a, b, c, d, flask_server, url):
         p = LinkedListPipeline()
-        p.add(Merge(a, b, first_idx=-1, second_idx=-1))
-        p.add(SBS(-1, -2, factor=1))
-        p.add(Merge(c, d, first_idx=-1, second_idx=-1))
-        p.add(SBS(-1, -2, factor=1))
-        sbs = SBS(-1, -4, factor=1, flip=True)
-        p.add(sbs)
+        grid = Grid([a, b, c, d], rows=2, cols=2)
+        p.add(grid)
         p.add(FlaskViewer(flask_server, stream_url=url, stream_name=url))
-        return p, sbs
+        return p, grid
     
     stream1_link = C_STREAM_1
     stream2_link = C_STREAM_2
@@ -82,27 +78,33 @@ def big_brother():
     mmdet2_model = "~/mmdetection/configs/mask_rcnn/mask_rcnn_x101_64x4d_fpn_1x_coco.py"
     mmdet2_weights = "https://download.openmmlab.com/mmdetection/v2.0/mask_rcnn/mask_rcnn_x101_64x4d_fpn_1x_coco/mask_rcnn_x101_64x4d_fpn_1x_coco_20200201-9352eb0d.pth"
 
-    cam1 = Buffer(OpenCVCapture, stream1_link, use_mp=True)
-    cam2 = Buffer(OpenCVCapture, stream2_link, use_mp=True)
+    cam1 = Tee(Buffer(OpenCVCapture, stream1_link, threaded=True, use_mp=True))
+    cam2 = Tee(Buffer(OpenCVCapture, stream2_link, threaded=True, use_mp=True))
     server_cam1 = FlaskServer(name="camera1_server", port=5000)
     server_cam2 = FlaskServer(name="camera2_server", port=5005)
     server_stream = FlaskServer(name="stream_server", port=5010)
 
+    # One model instance per model, shared by both cameras
+    mmdet1 = InferenceServer(MMDetect, mmdet1_model, mmdet1_weights, input_idx=-1, dev="cuda:1")
+    mmdet2 = InferenceServer(MMDetect, mmdet2_model, mmdet2_weights, input_idx=-1, dev="cuda:1")
+    dtron1 = InferenceServer(Detectron2, Detectron2.create_config(dtron1_model, dtron1_weights, dev="cuda:0"))
+    dtron2 = InferenceServer(Detectron2, Detectron2.create_config(dtron2_model, dtron2_weights, dev="cuda:0"))
+
     mmdet1_cam1, mmdet1_inlay_cam1 = \
-        get_pipeline(capture_element=cam1,
-                     model_element=MMDetect(mmdet1_model, mmdet1_weights, input_idx=-1, dev="cuda:1"),
+        get_pipeline(capture_element=cam1.subscribe("mmdet1"),
+                     model_element=mmdet1.client(),
                      flask_server=server_cam1, url="/mmdet1")
     mmdet2_cam1, mmdet2_inlay_cam1 = \
-        get_pipeline(capture_element=cam1,
-                     model_element=MMDetect(mmdet2_model, mmdet2_weights, input_idx=-1, dev="cuda:1"),
+        get_pipeline(capture_element=cam1.subscribe("mmdet2"),
+                     model_element=mmdet2.client(),
                      flask_server=server_cam1, url="/mmdet2")
     dtron1_cam1, dtron1_inlay_cam1 = \
-        get_pipeline(capture_element=cam1,
-                     model_element=Detectron2(Detectron2.create_config(dtron1_model, dtron1_weights, dev="cuda:0")),
+        get_pipeline(capture_element=cam1.subscribe("dtron1"),
+                     model_element=dtron1.client(),
                      flask_server=server_cam1, url="/dtron1")
     dtron2_cam1, dtron2_inlay_cam1 = \
-        get_pipeline(capture_element=cam1,
-                     model_element=Detectron2(Detectron2.create_config(dtron2_model, dtron2_weights, dev="cuda:0")),
+        get_pipeline(capture_element=cam1.subscribe("dtron2"),
+                     model_element=dtron2.client(),
                      flask_server=server_cam1, url="/dtron2")
 
     cam1, cam1_grid = create_4x4_overview(mmdet1_inlay_cam1,
@@ -113,20 +115,20 @@ def big_brother():
                                           url="/stream")
 
     mmdet1_cam2, mmdet1_inlay_cam2 = \
-        get_pipeline(capture_element=cam2,
-                     model_element=MMDetect(mmdet1_model, mmdet1_weights, input_idx=-1, dev="cuda:1"),
+        get_pipeline(capture_element=cam2.subscribe("mmdet1"),
+                     model_element=mmdet1.client(),
                      flask_server=server_cam2, url="/mmdet1")
     mmdet2_cam2, mmdet2_inlay_cam2 = \
-        get_pipeline(capture_element=cam2,
-                     model_element=MMDetect(mmdet2_model, mmdet2_weights, input_idx=-1, dev="cuda:1"),
+        get_pipeline(capture_element=cam2.subscribe("mmdet2"),
+                     model_element=mmdet2.client(),
                      flask_server=server_cam2, url="/mmdet2")
     dtron1_cam2, dtron1_inlay_cam2 = \
-        get_pipeline(capture_element=cam2,
-                     model_element=Detectron2(Detectron2.create_config(dtron1_model, dtron1_weights, dev="cuda:0")),
+        get_pipeline(capture_element=cam2.subscribe("dtron1"),
+                     model_element=dtron1.client(),
                      flask_server=server_cam2, url="/dtron1")
     dtron2_cam2, dtron2_inlay_cam2 = \
-        get_pipeline(capture_element=cam2,
-                     model_element=Detectron2(Detectron2.create_config(dtron2_model, dtron2_weights, dev="cuda:0")),
+        get_pipeline(capture_element=cam2.subscribe("dtron2"),
+                     model_element=dtron2.client(),
                      flask_server=server_cam2, url="/dtron2")
 
     cam2, cam2_grid = create_4x4_overview(mmdet1_inlay_cam2,
@@ -137,10 +139,14 @@ def big_brother():
                                           url="/stream")
 
     p = LinkedListPipeline()
-    p.add(Merge(cam1_grid, cam2_grid, first_idx=-1, second_idx=-1))
-    p.add(SBS(-1, -2, factor=1))
+    p.add(Grid([cam1_grid, cam2_grid], rows=1, cols=2))
     p.add(FlaskViewer(server_stream, stream_url="/stream", stream_name="stream"))
 
+    mmdet1.start()
+    mmdet2.start()
+    dtron1.start()
+    dtron2.start()
+
     mmdet1_cam1.start(block=False)
     mmdet2_cam1.start(block=False)
     dtron1_cam1.start(block=False)
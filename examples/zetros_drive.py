@@ -2,7 +2,7 @@ from capture import OpenCVCapture
 from pipelines import LinkedListPipeline
 from processors.llava import Llava
 
-from processors.zetros import LegoZetros
+from processors.zetros import LegoZetros, DIRECTION_WORDS
 from utils import Buffer, SBS
 from viewers import FlaskServer, FlaskViewer
 
@@ -13,7 +13,8 @@ def zetros_async():
     stream_link = C_STREAM
     pipeline = LinkedListPipeline()
     pipeline.add(Buffer(OpenCVCapture, stream_link, True))
-    pipeline.add(Buffer(Llava, "small", "small toy", default_idx=[-1, "no answer"]))
+    pipeline.add(Buffer(Llava, "small", "small toy", stop_words=DIRECTION_WORDS, cache_size=64,
+                        default_idx=[-1, "no answer"]))
     pipeline.add(Buffer(LegoZetros, C_ZETROS, -2, -1, False, True, default_idx=[-2, "stay"]))
     pipeline.add(SBS(first_idx=-2, second_idx=-5, factor=1))
     pipeline.add(FlaskViewer(FlaskServer()))
@@ -23,7 +24,7 @@ def zetros_sync():
     stream_link = C_STREAM
     pipeline = LinkedListPipeline()
     pipeline.add(OpenCVCapture(stream_link, flip_h=True))
-    pipeline.add(Llava("small", ooi="small toy"))
+    pipeline.add(Llava("small", ooi="small toy", stop_words=DIRECTION_WORDS, cache_size=64))
     pipeline.add(LegoZetros(host=C_ZETROS, image_idx=-2, text_idx=-1, dummy=False))
     pipeline.add(SBS(first_idx=-2, second_idx=-5, factor=1))
     pipeline.add(FlaskViewer(FlaskServer()))
@@ -0,0 +1,60 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+import time
+import numpy as np
+from processors.zetros import LegoZetros
+from utils import Frame
+
+C_PORT = 5082
+
+
+class StandInRobot(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the LegoZetros robot: every command takes delay seconds to execute.
+    """
+    protocol_version = "HTTP/1.1"
+    delay = 0.3
+    commands = []
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        self.commands.append(self.path.strip("/"))
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+
+def drive(duration=5.0, fps=20):
+    """
+    Feed a new direction at fps into LegoZetros and report how long the pipeline waits per frame.
+    """
+    server = ThreadingHTTPServer(("localhost", C_PORT), StandInRobot)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    zetros = LegoZetros(f"http://localhost:{C_PORT}", image_idx=-2, text_idx=-1)
+    zetros.start()
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    directions = ["left", "center", "right", "backward"]
+    frames = 0
+    worst = 0.0
+    start = time.time()
+    while time.time() - start < duration:
+        t = time.perf_counter()
+        zetros([Frame(image), Frame(f"{frames}: the toy is on the {directions[frames // 10 % 4]}")])
+        worst = max(worst, time.perf_counter() - t)
+        frames += 1
+        time.sleep(1.0 / fps)
+    print(f"frames: {frames} worst pipeline call: {worst * 1e3:.1f} ms")
+    print(f"dispatcher: {zetros.stats()} robot executed {len(StandInRobot.commands)} commands")
+    zetros.stop()
+    zetros.wait()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    drive()
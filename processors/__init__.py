@@ -1,3 +1,9 @@
+from .registry import *
+from .overlay import *
+from .detections import *
+from .tracking import *
+from .tiling import *
+
 try:
     from .detectron2 import *
 except ImportError as e:
@@ -12,3 +18,13 @@ try:
     from .llava import *
 except ImportError as e:
     print("Warning:", e)
+
+try:
+    from .batching import *
+except ImportError as e:
+    print("Warning:", e)
+
+try:
+    from .onnx_detector import *
+except ImportError as e:
+    print("Warning:", e)
@@ -0,0 +1,190 @@
+from multiprocessing import Process, Queue, Value
+from typing import Any, List
+from queue import Empty
+from utils import as_captures
+import ctypes
+import time
+
+
+def serve_batches(element, args, kwargs, requests, responses, max_batch, max_delay, terminate, running):
+    """
+    This method runs in the process of the InferenceServer
+    """
+    try:
+        if type(element) == type:
+            element = element(*args, **kwargs)
+            element.start()
+        while not terminate.value:
+            try:
+                request = requests.get(timeout=0.1)
+            except Empty:
+                continue
+            if request is None:
+                break
+
+            # Collect requests until the batch is full or the oldest request waited max_delay seconds
+            batch = [request]
+            deadline = time.time() + max_delay
+            while len(batch) < max_batch:
+                try:
+                    request = requests.get(timeout=max(deadline - time.time(), 0))
+                except Empty:
+                    break
+                if request is None:
+                    terminate.value = True
+                    break
+                batch.append(request)
+
+            images = [image for _, _, image in batch]
+            try:
+                if hasattr(element, "process_batch"):
+                    outputs = element.process_batch(images)
+                else:
+                    outputs = [element.process_image(image) for image in images]
+            except Exception as e:
+                # Answer every caller of the batch instead of letting them wait for their timeout
+                print(f"InferenceServer failed to process a batch of {len(batch)} frames: {e!r}")
+                outputs = [None] * len(batch)
+            for (client_id, request_id, _), output in zip(batch, outputs):
+                responses[client_id].put((request_id, output))
+    finally:
+        running.value = False
+        print(f"Stopped InferenceServer process")
+
+
+class InferenceClient:
+    def __init__(self, server: 'InferenceServer', client_id: int, input_idx=-1, timeout=30.0):
+        """
+        Element that sends the image at input_idx to an InferenceServer and appends the result. __call__ blocks until
+            the result is there, so wrap the client in a Buffer (use_mp=False is enough) to keep the pipeline
+            responsive. Clients can be pickled to other processes. The server is shared by all clients, so starting
+            and stopping it is left to whoever created it.
+        """
+        self.server = server
+        self.client_id = client_id
+        self.requests = server.requests
+        self.responses = server.responses[client_id]
+        self.running = server.running
+        self.input_idx = input_idx
+        self.timeout = timeout
+        self.request_id = 0
+
+        self.prev = None
+        self.next = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["server"] = None
+        return state
+
+    def alive(self) -> bool:
+        """
+        :return: False if the server is not started, stopped or its process died.
+        """
+        if not self.running.value:
+            return False
+        # Only the client in the process that created the server can see a process that was killed
+        process = self.server.process if self.server is not None else None
+        return process is None or process.is_alive()
+
+    def infer(self, image):
+        if not self.alive():
+            print(f"InferenceServer is not running")
+            return None
+        self.request_id += 1
+        self.requests.put((self.client_id, self.request_id, image))
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                # Wait in short steps to fail fast when the server died
+                request_id, output = self.responses.get(timeout=min(max(deadline - time.time(), 0), 0.1))
+            except Empty:
+                if time.time() >= deadline:
+                    print(f"No result from InferenceServer within {self.timeout} seconds")
+                    return None
+                if not self.alive():
+                    print(f"InferenceServer stopped before it returned a result")
+                    return None
+                continue
+            if request_id == self.request_id:
+                return output
+            # Drop the late result of a request that timed out
+
+    def __call__(self, captures: List[Any]) -> List[Any]:
+        if self.prev:
+            captures = self.prev([])
+        captures = as_captures(captures)
+        input_image = captures[self.input_idx]
+        if input_image is not None:
+            captures.derive(self.input_idx, self.infer(input_image))
+        else:
+            captures.append(None)
+        return captures
+
+    def start(self, block: bool = False):
+        return
+
+    def stop(self):
+        return
+
+    def wait(self, timeout=3):
+        return False
+
+
+class InferenceServer:
+    def __init__(self, element, *args, max_batch=4, max_delay=0.01, **kwargs):
+        """
+        This class hosts a single instance of a processor (e.g. Detectron2 or MMDetect) in its own process and
+            serves the frames of many pipelines. Requests are collected into dynamic batches of at most max_batch
+            frames, waiting at most max_delay seconds for a batch to fill. The processor should implement
+            process_batch(images) or process_image(image).
+
+        All clients must be created with client() before the server is started.
+
+        :param element: The processor class (constructed in the server process with *args and **kwargs) or instance.
+        :param max_batch: The maximum number of frames per batch.
+        :param max_delay: The maximum time in seconds the first frame of a batch waits for more frames.
+        """
+        self.element = element
+        self.args = args
+        self.kwargs = kwargs
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.terminate = Value(ctypes.c_bool)
+        self.terminate.value = False
+        # Set when the server is started, cleared when its process stops (also when the processor fails)
+        self.running = Value(ctypes.c_bool)
+        self.running.value = False
+        self.requests = Queue()
+        self.responses = []
+        self.process = None
+
+    def client(self, input_idx=-1, timeout=30.0) -> InferenceClient:
+        if self.process is not None:
+            raise RuntimeError("Clients must be created before the InferenceServer is started")
+        self.responses.append(Queue())
+        return InferenceClient(self, len(self.responses) - 1, input_idx=input_idx, timeout=timeout)
+
+    def start(self, block: bool = False):
+        if self.process is None:
+            print(f"Starting {self.__class__} {id(self)}")
+            self.running.value = True
+            self.process = Process(target=serve_batches, args=(self.element, self.args, self.kwargs, self.requests,
+                                                               self.responses, self.max_batch, self.max_delay,
+                                                               self.terminate, self.running))
+            self.process.start()
+            print(f"Started {self.__class__} {id(self)}")
+        if block:
+            self.wait()
+
+    def stop(self):
+        if not self.terminate.value:
+            print(f"Stopping {self.__class__} {id(self)}")
+            self.terminate.value = True
+            self.requests.put(None)
+
+    def wait(self, timeout=None):
+        if self.process is not None:
+            self.process.join(timeout=timeout)
+            return self.process.is_alive()
+        return False
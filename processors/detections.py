@@ -0,0 +1,89 @@
+from typing import Sequence
+import numpy as np
+
+
+def rle_encode(mask) -> dict:
+    """
+    Encode a binary mask as an uncompressed COCO run-length encoding: the lengths of alternating runs of zeros and
+        ones in column-major order, starting with zeros.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    flat = mask.ravel(order="F")
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    runs = np.diff(np.concatenate([[0], changes, [len(flat)]]))
+    if len(flat) > 0 and flat[0]:
+        runs = np.concatenate([[0], runs])
+    return {"size": [int(mask.shape[0]), int(mask.shape[1])], "counts": runs.tolist()}
+
+
+def rle_decode(rle: dict):
+    height, width = rle["size"]
+    counts = np.asarray(rle["counts"], dtype=np.int64)
+    values = np.arange(len(counts)) % 2 == 1
+    return np.repeat(values, counts).reshape((height, width), order="F")
+
+
+class Detections:
+    __slots__ = ("boxes", "scores", "classes", "masks", "class_names")
+
+    def __init__(self, boxes, scores=None, classes=None, masks=None, class_names: Sequence[str] = None):
+        """
+        Compact detection record that a processor appends to the captures next to its rendered image.
+
+        :param boxes: (N, 4) float32 array of x1, y1, x2, y2.
+        :param scores: (N,) float32 array.
+        :param classes: (N,) int array of class ids.
+        :param masks: A list of N run-length encoded masks (see rle_encode) or None.
+        :param class_names: The names of the class ids or None.
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.ones(len(self.boxes), dtype=np.float32) if scores is None \
+            else np.asarray(scores, dtype=np.float32)
+        self.classes = np.zeros(len(self.boxes), dtype=np.int64) if classes is None \
+            else np.asarray(classes, dtype=np.int64)
+        self.masks = masks
+        self.class_names = class_names
+
+    @classmethod
+    def from_arrays(cls, boxes, scores=None, classes=None, masks=None, class_names=None) -> 'Detections':
+        """
+        :param masks: (N, H, W) boolean array or None, encoded as run-length encodings.
+        """
+        if boxes is None:
+            boxes = np.zeros((0, 4), dtype=np.float32)
+        rles = [rle_encode(mask) for mask in masks] if masks is not None else None
+        return cls(boxes, scores, classes, rles, class_names)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __repr__(self):
+        return f"Detections({len(self)})"
+
+    def copy(self) -> 'Detections':
+        return Detections(self.boxes.copy(), self.scores.copy(), self.classes.copy(),
+                          None if self.masks is None else list(self.masks), self.class_names)
+
+    def labels(self):
+        if self.class_names is None:
+            return [str(c) for c in self.classes]
+        return [self.class_names[c] if c < len(self.class_names) else str(c) for c in self.classes]
+
+    def decode_masks(self):
+        """
+        :return: (N, H, W) boolean array or None.
+        """
+        if self.masks is None or len(self.masks) == 0:
+            return None
+        return np.stack([rle_decode(rle) for rle in self.masks])
+
+    def to_dict(self, masks=True) -> dict:
+        """
+        :return: A json serializable dict, with the masks as run-length encodings if masks is True.
+        """
+        result = {"boxes": np.round(self.boxes.astype(np.float64), 1).tolist(),
+                  "scores": np.round(self.scores.astype(np.float64), 3).tolist(),
+                  "classes": self.classes.tolist(), "labels": self.labels()}
+        if masks and self.masks is not None:
+            result["masks"] = self.masks
+        return result
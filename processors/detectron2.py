@@ -7,25 +7,106 @@ from detectron2.config import get_cfg
 from detectron2.utils.visualizer import Visualizer
 from detectron2.data import MetadataCatalog
 from typing import List, Any
+from utils import as_captures, letterbox
+from .registry import registry
+from .overlay import draw_detections
+from .detections import Detections
+import torch
 import time
 
 
 class Detectron2:
 
-    def __init__(self, config, input_idx=-1):
+    def __init__(self, config, input_idx=-1, fast_render=False, output_detections=False, infer_size=None):
+        """
+        Elements in the same process with the same config share one predictor through the model registry.
+
+        :param fast_render: Draw with the NumPy/OpenCV overlay renderer instead of the matplotlib Visualizer.
+        :param output_detections: Also append a Detections record to the captures, before the rendered image. Wrap
+            the element in a Buffer with default_idx=[None, -2] then, so the layout does not change while there is
+            no result yet.
+        :param infer_size: The longest side (or (width, height)) of the model input. The frame is scaled down to
+            fit instead of resized by the test augmentation of the config, and the predictions are mapped back to
+            the full resolution frame. None to use the resolution of the config.
+        """
         self.config = config
-        self.predictor = self.create_predictor(self.config)
+        self.fast_render = fast_render
+        self.output_detections = output_detections
+        self.infer_size = infer_size
+        self.class_names = MetadataCatalog.get(config.DATASETS.TRAIN[0]).get("thing_classes", None)
+        self.shared = registry.acquire(("detectron2", config.MODEL.WEIGHTS, config.MODEL.DEVICE, config.dump()),
+                                       lambda: self.create_predictor(config))
+        self.predictor = self.shared.model
         self.input_idx = input_idx
 
+        self.last_outputs = None
         self.prev = None
         self.next = None
 
+    def predict(self, image):
+        if self.infer_size is not None:
+            return self.predict_batch([image])[0]["instances"]
+        with self.shared.lock:
+            outputs = self.predictor(image)
+        return outputs["instances"]
+
     def process_image(self, image):
-        outputs = self.predictor(image)
+        return self.draw(image, self.predict(image))
+
+    def detect(self, image) -> Detections:
+        return self.to_detections(self.predict(image))
+
+    def detect_batch(self, images) -> List[Detections]:
+        return [self.to_detections(output["instances"]) for output in self.predict_batch(images)]
+
+    def process_batch(self, images):
+        outputs = self.predict_batch(images)
+        return [self.draw(image, output["instances"]) for image, output in zip(images, outputs)]
+
+    def predict_batch(self, images):
+        """
+        Run the model on a list of BGR images at once, with the same preprocessing as DefaultPredictor. The model
+            maps its predictions back to the height and width of the original images.
+        """
+        with torch.no_grad():
+            inputs = []
+            for image in images:
+                height, width = image.shape[:2]
+                if self.infer_size is not None:
+                    image, _ = letterbox(image, self.infer_size, pad=False)
+                if self.predictor.input_format == "RGB":
+                    image = image[:, :, ::-1]
+                if self.infer_size is not None:
+                    tensor = image
+                else:
+                    tensor = self.predictor.aug.get_transform(image).apply_image(image)
+                tensor = torch.as_tensor(tensor.astype("float32").transpose(2, 0, 1))
+                inputs.append({"image": tensor, "height": height, "width": width})
+            with self.shared.lock:
+                return self.predictor.model(inputs)
+
+    def draw(self, image, instances):
+        if self.fast_render:
+            return draw_detections(image, *self.instances_to_arrays(instances), class_names=self.class_names)
         v = Visualizer(image[:, :, ::-1], MetadataCatalog.get(self.config.DATASETS.TRAIN[0]), scale=1)
-        out = v.draw_instance_predictions(outputs["instances"].to("cpu"))
+        out = v.draw_instance_predictions(instances.to("cpu"))
         return out.get_image()[:, :, ::-1]
 
+    @staticmethod
+    def instances_to_arrays(instances):
+        """
+        :return: The boxes, scores, classes and masks (or None) of instances as numpy arrays.
+        """
+        instances = instances.to("cpu")
+        boxes = instances.pred_boxes.tensor.numpy() if instances.has("pred_boxes") else None
+        scores = instances.scores.numpy() if instances.has("scores") else None
+        classes = instances.pred_classes.numpy() if instances.has("pred_classes") else None
+        masks = instances.pred_masks.numpy() if instances.has("pred_masks") else None
+        return boxes, scores, classes, masks
+
+    def to_detections(self, instances) -> Detections:
+        return Detections.from_arrays(*self.instances_to_arrays(instances), class_names=self.class_names)
+
     @staticmethod
     def create_config(path="COCO-InstanceSegmentation/mask_rcnn_R_50_FPN_3x.yaml",
                       checkpoint="COCO-InstanceSegmentation/mask_rcnn_R_50_FPN_3x.yaml",
@@ -45,11 +126,20 @@ class Detectron2:
     def __call__(self, captures: List[Any]) -> List[Any]:
         if self.prev:
             captures = self.prev([])
-        input_image = captures[self.input_idx]
-        if input_image is not None:
-            output_image = self.process_image(input_image)
-            captures.append(output_image)
+        captures = as_captures(captures)
+        frame = captures.frame(self.input_idx)
+        if frame.image is not None:
+            if captures.reuse_outputs(frame, self.last_outputs):
+                return captures
+            num_caps = len(captures)
+            instances = self.predict(frame.image)
+            if self.output_detections:
+                captures.append(frame.derive(self.to_detections(instances)))
+            captures.append(frame.derive(self.draw(frame.image, instances)))
+            self.last_outputs = captures.outputs_since(num_caps)
         else:
+            if self.output_detections:
+                captures.append(None)
             captures.append(None)
         return captures
 
@@ -57,7 +147,9 @@ class Detectron2:
         return
 
     def stop(self):
-        return
+        if self.shared is not None:
+            registry.release(self.shared)
+            self.shared = None
 
     def wait(self, timeout=3):
         return False
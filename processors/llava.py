@@ -1,20 +1,37 @@
 from typing import Any, List
 import numpy as np
+import time
 from PIL import Image, ImageDraw, ImageFont
 
 from processors.llava_infer import LavaInfer
-from utils import text_box, ALIGNMENT_LEFT, ALIGNMENT_TOP
+from utils import text_box, ALIGNMENT_LEFT, ALIGNMENT_TOP, as_captures, letterbox, PerceptualCache
 
 
 class Llava:
 
-    def __init__(self, llava_type='small', ooi=None, input_idx=-1):
+    def __init__(self, llava_type='small', ooi=None, input_idx=-1, infer_size=None, stop_words=None, cache_size=0,
+                 cache_distance=4):
+        """
+        :param infer_size: The longest side (or (width, height)) the frame is scaled down to for the model, the
+            answer is drawn on the full resolution frame. None to pass the frame as is.
+        :param stop_words: Stop generating the answer as soon as one of these words is produced, e.g. the
+            DIRECTION_WORDS of LegoZetros.
+        :param cache_size: The number of answers that are cached by perceptual hash of the frame and prompt (0 to
+            disable the cache). Similar but not identical scenes get the same answer, so only enable it when that is
+            acceptable.
+        :param cache_distance: The maximum Hamming distance (of 64 bits) between the hash of a frame and a cached
+            frame to reuse its answer.
+        """
 
         # Initialize Llava model
         self.lava_infer =  LavaInfer(llava_type)
         self.counter = 0
 
         self.input_idx = input_idx
+        self.infer_size = infer_size
+        self.stop_words = stop_words
+        self.cache = PerceptualCache(cache_size, cache_distance) if cache_size > 0 else None
+        self.last_outputs = None
         self.prev = None
         self.next = None
         self.ooi = ooi
@@ -31,10 +48,27 @@ class Llava:
         return image
 
     def get_answer(self, image, prompt):
+        if self.cache is not None:
+            cache_key, answer = self.cache.get(image, prompt)
+            if answer is not None:
+                print(f"Llava cached answer ({self.cache.stats()}): {answer}")
+                return answer
         img = Image.fromarray(image)
-        answer = self.lava_infer.infer(prompt, [img])
+        start = time.time()
+        answer = self.lava_infer.infer(prompt, [img], stop_words=self.stop_words)
+        print(f"Llava answer in {time.time() - start:.2f}s, {self.lava_infer.tokens_generated} tokens: {answer}")
+        if self.cache is not None:
+            self.cache.put(cache_key, answer)
         return answer
 
+    def stats(self):
+        """
+        :return: The hits and misses of the answer cache and the number of tokens of the last generated answer.
+        """
+        stats = self.cache.stats() if self.cache is not None else {}
+        stats["tokens_generated"] = self.lava_infer.tokens_generated
+        return stats
+
     def overlay_answer(self, image, text):
         img = Image.fromarray(image // 2)
         self.draw_text(img, text)
@@ -43,16 +77,25 @@ class Llava:
     def __call__(self, captures: List[Any]) -> List[Any]:
         if self.prev:
             captures = self.prev([])
-        input_image = captures[self.input_idx].copy()
-        if input_image is not None:
+        captures = as_captures(captures)
+        frame = captures.frame(self.input_idx)
+        if frame.image is not None:
+            if captures.reuse_outputs(frame, self.last_outputs):
+                return captures
+            num_caps = len(captures)
+            input_image = frame.image.copy()
             if self.ooi is None:
                 prompt = "What is the object on the floor, and where is it in the image, left, center or right?"
             else:
                 prompt = f"Where is the {self.ooi} in the image, left, center or right?"
-            answer = self.get_answer(input_image, prompt=prompt)
-            captures.append(self.overlay_answer(input_image, answer))
-            captures.append(f"{self.counter}: {answer}")
+            model_image = input_image
+            if self.infer_size is not None:
+                model_image, _ = letterbox(input_image, self.infer_size, pad=False)
+            answer = self.get_answer(model_image, prompt=prompt)
+            captures.derive(self.input_idx, self.overlay_answer(input_image, answer))
+            captures.derive(self.input_idx, f"{self.counter}: {answer}")
             self.counter += 1 # make every answer unique
+            self.last_outputs = captures.outputs_since(num_caps)
         else:
             captures.append(None)
             captures.append("")
@@ -4,6 +4,7 @@ from llava.model.builder import load_pretrained_model
 from llava.mm_utils import get_model_name_from_path
 from llava.eval.run_llava import eval_model
 from PIL import Image
+import copy
 import re
 import argparse
 import torch
@@ -41,6 +42,11 @@ class LavaInfer():
         self.num_beams = 1
         self.max_new_tokens = 512
 
+        # caches and stats
+        self.input_ids_cache = {}
+        self.prefix_cache = {}
+        self.tokens_generated = 0
+
         # init model
         self.create_model(model_type)
         self.set_conv_mode()
@@ -99,19 +105,91 @@ class LavaInfer():
         return qs
 
 
-    def infer(self, text: str, images: List):
-        qs = self.to_query(text)
-
-        conv = conv_templates[self.conv_mode].copy()
-        conv.append_message(conv.roles[0], qs)
-        conv.append_message(conv.roles[1], None)
-        prompt = conv.get_prompt()
+    def get_input_ids(self, text):
+        """
+        Build and tokenize the conversation prompt of text once.
+        """
+        input_ids = self.input_ids_cache.get(text)
+        if input_ids is None:
+            conv = conv_templates[self.conv_mode].copy()
+            conv.append_message(conv.roles[0], self.to_query(text))
+            conv.append_message(conv.roles[1], None)
+            prompt = conv.get_prompt()
+            input_ids = tokenizer_image_token(prompt, self.tokenizer, IMAGE_TOKEN_INDEX, return_tensors="pt")
+            input_ids = input_ids.unsqueeze(0).to(self.model.device)
+            self.input_ids_cache[text] = input_ids
+        return input_ids
+
+    def get_prefix(self, prefix_ids):
+        """
+        Run the text before the image (the system prompt) through the model once.
+
+        :return: The key-value states of the prefix.
+        """
+        key = tuple(prefix_ids[0].tolist())
+        past_key_values = self.prefix_cache.get(key)
+        if past_key_values is None:
+            embeds = self.model.get_model().embed_tokens(prefix_ids)
+            past_key_values = self.model(inputs_embeds=embeds, use_cache=True).past_key_values
+            self.prefix_cache[key] = past_key_values
+        # Cache objects are extended in place, legacy tuples are not
+        return past_key_values if isinstance(past_key_values, tuple) else copy.deepcopy(past_key_values)
+
+    @staticmethod
+    def find_stop_word(text, stop_words):
+        # Only complete words, the last word may still be continued by the next token
+        words = re.findall(r"[a-z]+(?=[^a-z])", text.lower())
+        return any(word in stop_words for word in words)
+
+    def decode_greedy(self, input_ids, images_tensor, image_sizes, stop_words=None):
+        """
+        Greedy decoding that reuses the cached prefix and stops at the end of sequence token or as soon as one of
+            stop_words is produced.
+
+        :return: The generated token ids.
+        """
+        image_pos = (input_ids[0] == IMAGE_TOKEN_INDEX).nonzero()[0, 0].item()
+        prefix_ids, suffix_ids = input_ids[:, :image_pos], input_ids[:, image_pos:]
+        past_key_values = self.get_prefix(prefix_ids) if image_pos > 0 else None
+
+        _, _, _, _, embeds, _ = self.model.prepare_inputs_labels_for_multimodal(
+            suffix_ids, None, None, None, None, images_tensor, image_sizes=image_sizes)
+        position = image_pos + embeds.shape[1]
+        position_ids = torch.arange(image_pos, position, device=embeds.device).unsqueeze(0)
+        outputs = self.model(inputs_embeds=embeds, position_ids=position_ids, past_key_values=past_key_values,
+                             use_cache=True)
+
+        output_ids = []
+        stop_words = set(word.lower() for word in stop_words) if stop_words else None
+        while len(output_ids) < self.max_new_tokens:
+            next_id = outputs.logits[:, -1].argmax(dim=-1)
+            if next_id.item() == self.tokenizer.eos_token_id:
+                break
+            output_ids.append(next_id.item())
+            if stop_words and self.find_stop_word(self.tokenizer.decode(output_ids), stop_words):
+                break
+            position_ids = torch.tensor([[position]], device=embeds.device)
+            position += 1
+            outputs = self.model(input_ids=next_id.unsqueeze(0), position_ids=position_ids,
+                                 past_key_values=outputs.past_key_values, use_cache=True)
+        return output_ids
+
+    def infer(self, text: str, images: List, stop_words=None):
+        """
+        :param stop_words: Stop generating as soon as one of these words is produced (only for greedy decoding).
+        """
+        input_ids = self.get_input_ids(text)
 
         image_sizes = [x.size for x in images]
         images_tensor = process_images(images, self.image_processor, self.model.config).to(self.model.device, dtype=torch.float16)
-        input_ids = tokenizer_image_token(prompt, self.tokenizer, IMAGE_TOKEN_INDEX, return_tensors="pt").unsqueeze(0).cuda()
 
         with torch.inference_mode():
+            if self.temperature == 0 and self.num_beams == 1:
+                output_ids = self.decode_greedy(input_ids, images_tensor, image_sizes, stop_words)
+                self.tokens_generated = len(output_ids)
+                return self.tokenizer.decode(output_ids, skip_special_tokens=True).strip()
+
+            # Sampling or beam search
             output_ids = self.model.generate(
                 input_ids,
                 images=images_tensor,
@@ -124,6 +202,7 @@ class LavaInfer():
                 use_cache=True,
             )
 
+        self.tokens_generated = output_ids.shape[1]
         outputs = self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)[0].strip()
         return outputs
 
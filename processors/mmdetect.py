@@ -3,6 +3,10 @@ from mmdet.apis import init_detector, inference_detector
 import mmcv
 from threading import Lock
 from typing import Any, List
+from utils import as_captures, letterbox, remap_boxes, remap_mask
+from .registry import registry
+from .overlay import draw_detections, mmdet_to_arrays
+from .detections import Detections
 import os
 import requests
 import shutil
@@ -41,30 +45,134 @@ class MMDetect:
                  config_file='~/mmdetection/configs/faster_rcnn/faster_rcnn_r50_fpn_1x_coco.py',
                  checkpoint_file='https://download.openmmlab.com/mmdetection/v2.0/faster_rcnn/faster_rcnn_r50_fpn_1x_coco/faster_rcnn_r50_fpn_1x_coco_20200130-047c8118.pth',
                  input_idx=-1,
-                 dev="cuda"):
-
+                 dev="cuda",
+                 fast_render=False,
+                 score_thr=0.3,
+                 output_detections=False,
+                 infer_size=None):
+        """
+        Elements in the same process with the same config, checkpoint and device share one detector through the
+            model registry.
+
+        :param fast_render: Draw with the NumPy/OpenCV overlay renderer instead of show_result, which is serialized
+            by the global matplotlib lock.
+        :param score_thr: The minimum score of a drawn or output detection.
+        :param output_detections: Also append a Detections record to the captures, before the rendered image. Wrap
+            the element in a Buffer with default_idx=[None, -2] then, so the layout does not change while there is
+            no result yet.
+        :param infer_size: The longest side (or (width, height)) of the model input. The frame is letterboxed to
+            this size, the test pipeline runs at this scale, and the predictions are mapped back to the full
+            resolution frame. None to use the resolution of the config.
+        """
         checkpoint_file = Zoo()(checkpoint_file)
 
-        self.predictor = init_detector(config_file, checkpoint_file, device=dev)
+        self.shared = registry.acquire(("mmdetect", os.path.expanduser(config_file), checkpoint_file, dev),
+                                       lambda: init_detector(config_file, checkpoint_file, device=dev))
+        self.predictor = self.shared.model
+        self.fast_render = fast_render
+        self.score_thr = score_thr
+        self.output_detections = output_detections
+        self.infer_size = (infer_size, infer_size) if isinstance(infer_size, int) else infer_size
         self.input_idx = input_idx
 
+        self.last_outputs = None
         self.prev = None
         self.next = None
 
+    def predict(self, image):
+        """
+        :param image: A BGR image or a list of images.
+        :return: The mmdet result (or list of results) in the coordinates of the given image(s).
+        """
+        if self.infer_size is None:
+            with self.shared.lock:
+                return inference_detector(self.predictor, image)
+
+        images = image if isinstance(image, list) else [image]
+        letterboxed = [letterbox(image, self.infer_size) for image in images]
+        with self.shared.lock:
+            # The model can be shared with elements that use another infer_size
+            previous = self.set_test_scale(self.predictor.cfg, self.infer_size)
+            try:
+                results = inference_detector(self.predictor, [image for image, _ in letterboxed])
+            finally:
+                if previous is not None:
+                    self.set_test_scale(self.predictor.cfg, previous)
+        results = [self.remap_result(result, transform, image.shape)
+                   for result, (_, transform), image in zip(results, letterboxed, images)]
+        return results if isinstance(image, list) else results[0]
+
+    @staticmethod
+    def set_test_scale(cfg, scale):
+        """
+        Set the img_scale of the test pipeline.
+
+        :return: The previous img_scale or None if the pipeline has no img_scale.
+        """
+        for step in cfg.data.test.pipeline:
+            if "img_scale" in step:
+                previous = step["img_scale"]
+                step["img_scale"] = scale
+                return previous
+        return None
+
+    @staticmethod
+    def remap_result(result, transform, shape):
+        """
+        Map the boxes (and masks) of an mmdet result from a letterboxed image back to an original image of shape.
+        """
+        bbox_result, segm_result = result[:2] if isinstance(result, tuple) else (result, None)
+        bbox_result = [remap_boxes(bboxes, transform) for bboxes in bbox_result]
+        if segm_result is None:
+            return bbox_result
+        if isinstance(segm_result, tuple):
+            segm_result = segm_result[0]
+        segm_result = [[remap_mask(mask, transform, shape) for mask in masks] for masks in segm_result]
+        return bbox_result, segm_result
+
     def process_image(self, image):
-        result = inference_detector(self.predictor, image)
+        return self.draw(image, self.predict(image))
+
+    def process_batch(self, images):
+        results = self.predict(images)
+        return [self.draw(image, result) for image, result in zip(images, results)]
+
+    def detect(self, image) -> Detections:
+        return self.to_detections(self.predict(image))
+
+    def detect_batch(self, images) -> List[Detections]:
+        return [self.to_detections(result) for result in self.predict(images)]
+
+    def to_detections(self, result) -> Detections:
+        return Detections.from_arrays(*mmdet_to_arrays(result, self.score_thr),
+                                      class_names=getattr(self.predictor, "CLASSES", None))
+
+    def draw(self, image, result):
+        if self.fast_render:
+            return draw_detections(image, *mmdet_to_arrays(result, self.score_thr),
+                                   class_names=getattr(self.predictor, "CLASSES", None))
         with lock:
-            out = self.predictor.show_result(image, result)
+            out = self.predictor.show_result(image, result, score_thr=self.score_thr)
         return out
 
     def __call__(self, captures: List[Any]) -> List[Any]:
         if self.prev:
             captures = self.prev([])
-        input_image = captures[self.input_idx].copy()
-        if input_image is not None:
-            output_image = self.process_image(input_image)
-            captures.append(output_image)
+        captures = as_captures(captures)
+        frame = captures.frame(self.input_idx)
+        if frame.image is not None:
+            if captures.reuse_outputs(frame, self.last_outputs):
+                return captures
+            num_caps = len(captures)
+            input_image = frame.image.copy()
+            result = self.predict(input_image)
+            if self.output_detections:
+                captures.append(frame.derive(self.to_detections(result)))
+            captures.append(frame.derive(self.draw(input_image, result)))
+            self.last_outputs = captures.outputs_since(num_caps)
         else:
+            if self.output_detections:
+                captures.append(None)
             captures.append(None)
         return captures
 
@@ -72,7 +180,9 @@ class MMDetect:
         return
 
     def stop(self):
-        return
+        if self.shared is not None:
+            registry.release(self.shared)
+            self.shared = None
 
     def wait(self, timeout=3):
         return False
@@ -0,0 +1,155 @@
+import onnxruntime as ort
+from typing import Any, List, Sequence
+from utils import as_captures, letterbox, remap_boxes
+from .registry import registry
+from .overlay import draw_detections
+from .detections import Detections
+from .tiling import nms
+import numpy as np
+
+
+class OnnxDetector:
+
+    def __init__(self, model_path, input_idx=-1, output_format="yolo", class_names: Sequence[str] = None,
+                 infer_size=640, score_thr=0.3, nms_threshold=0.5, intra_op_threads=0, inter_op_threads=0,
+                 providers=("CPUExecutionProvider",), output_detections=False):
+        """
+        Runs an exported detection model with ONNX Runtime, e.g. on machines without a GPU. The frame is letterboxed
+            into a preallocated input tensor that is bound to the session once and reused for every frame. Elements
+            in the same process with the same model and session options share one session through the model
+            registry.
+
+        :param model_path: The path of the .onnx model.
+        :param output_format: "yolo" for a single (1, 4 + classes, N) output of center x, center y, width, height
+            and class scores (e.g. an ultralytics export), or "detections" for boxes (N, 4) as x1, y1, x2, y2, scores
+            (N,) and classes (N,) outputs, in that order, after NMS (e.g. a torchvision or detectron2 export).
+        :param class_names: The names of the class ids or None.
+        :param infer_size: The longest side (or (width, height)) of the model input, only used if the model input
+            has a dynamic size.
+        :param score_thr: The minimum score of a detection.
+        :param nms_threshold: The IoU threshold of the NMS of the "yolo" format.
+        :param intra_op_threads: The number of threads used within an operator (0 for the ONNX Runtime default).
+        :param inter_op_threads: The number of threads used to run independent operators in parallel (0 to run the
+            operators sequentially).
+        :param providers: The ONNX Runtime execution providers in order of preference.
+        :param output_detections: Also append a Detections record to the captures, before the rendered image. Wrap
+            the element in a Buffer with default_idx=[None, -2] then, so the layout does not change while there is
+            no result yet.
+        """
+        self.model_path = model_path
+        self.input_idx = input_idx
+        self.output_format = output_format
+        self.class_names = class_names
+        self.score_thr = score_thr
+        self.nms_threshold = nms_threshold
+        self.output_detections = output_detections
+
+        self.shared = registry.acquire(("onnx", model_path, intra_op_threads, inter_op_threads, tuple(providers)),
+                                       lambda: self.create_session(model_path, intra_op_threads, inter_op_threads,
+                                                                   providers))
+        self.session = self.shared.model
+
+        model_input = self.session.get_inputs()[0]
+        height, width = model_input.shape[2:4]
+        if not isinstance(width, int) or not isinstance(height, int):
+            width, height = (infer_size, infer_size) if isinstance(infer_size, int) else infer_size
+        self.input_size = (width, height)
+        self.input_buffer = np.zeros((1, 3, height, width), dtype=np.float32)
+
+        # Sessions are thread safe, every element binds its own input buffer
+        self.binding = self.session.io_binding()
+        self.binding.bind_input(model_input.name, "cpu", 0, np.float32, list(self.input_buffer.shape),
+                                self.input_buffer.ctypes.data)
+        for output in self.session.get_outputs():
+            self.binding.bind_output(output.name)
+
+        self.last_outputs = None
+        self.prev = None
+        self.next = None
+
+    @staticmethod
+    def create_session(model_path, intra_op_threads=0, inter_op_threads=0, providers=("CPUExecutionProvider",)):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads > 0:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+            options.inter_op_num_threads = inter_op_threads
+        else:
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        return ort.InferenceSession(model_path, sess_options=options, providers=list(providers))
+
+    def predict(self, image):
+        """
+        :return: The boxes, scores and classes of image.
+        """
+        letterboxed, transform = letterbox(image, self.input_size, color=(114, 114, 114))
+        # BGR HWC uint8 to RGB NCHW float32 in [0, 1], written into the bound input buffer
+        np.multiply(letterboxed.transpose(2, 0, 1)[::-1], 1 / 255, out=self.input_buffer[0], casting="unsafe")
+        self.session.run_with_iobinding(self.binding)
+        outputs = self.binding.copy_outputs_to_cpu()
+
+        if self.output_format == "yolo":
+            output = outputs[0][0]
+            if output.shape[0] > output.shape[1]:
+                output = output.T
+            class_scores = output[4:].T
+            classes = class_scores.argmax(axis=1)
+            scores = class_scores[np.arange(len(classes)), classes]
+            keep = scores >= self.score_thr
+            cx, cy, w, h = output[:4, keep]
+            boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+            scores, classes = scores[keep], classes[keep]
+            keep = nms(boxes, scores, classes, self.nms_threshold, metric="iou")
+            boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+        else:
+            boxes = outputs[0].reshape(-1, 4)
+            scores = outputs[1].ravel()
+            classes = outputs[2].ravel()
+            keep = scores >= self.score_thr
+            boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+
+        height, width = image.shape[:2]
+        boxes = np.clip(remap_boxes(boxes, transform), 0, [width, height, width, height])
+        return boxes.astype(np.float32), scores.astype(np.float32), classes.astype(np.int64)
+
+    def process_image(self, image):
+        return draw_detections(image, *self.predict(image), class_names=self.class_names)
+
+    def detect(self, image) -> Detections:
+        return Detections(*self.predict(image), class_names=self.class_names)
+
+    def detect_batch(self, images) -> List[Detections]:
+        return [self.detect(image) for image in images]
+
+    def __call__(self, captures: List[Any]) -> List[Any]:
+        if self.prev:
+            captures = self.prev([])
+        captures = as_captures(captures)
+        frame = captures.frame(self.input_idx)
+        if frame.image is not None:
+            if captures.reuse_outputs(frame, self.last_outputs):
+                return captures
+            num_caps = len(captures)
+            boxes, scores, classes = self.predict(frame.image)
+            if self.output_detections:
+                captures.append(frame.derive(Detections(boxes, scores, classes, class_names=self.class_names)))
+            captures.append(frame.derive(draw_detections(frame.image, boxes, scores, classes,
+                                                         class_names=self.class_names)))
+            self.last_outputs = captures.outputs_since(num_caps)
+        else:
+            if self.output_detections:
+                captures.append(None)
+            captures.append(None)
+        return captures
+
+    def start(self, block: bool = False):
+        return
+
+    def stop(self):
+        if self.shared is not None:
+            registry.release(self.shared)
+            self.shared = None
+
+    def wait(self, timeout=3):
+        return False
@@ -0,0 +1,88 @@
+from typing import Sequence
+import cv2
+import numpy as np
+
+
+def create_palette(num_colors=256):
+    """
+    Distinct BGR colors, the hue steps by the golden ratio so neighbouring class ids get different colors.
+    """
+    hues = (np.arange(num_colors) * 0.618033988749895 % 1.0 * 180).astype(np.uint8)
+    hsv = np.stack([hues, np.full(num_colors, 200, np.uint8), np.full(num_colors, 255, np.uint8)], axis=1)
+    return cv2.cvtColor(hsv[None], cv2.COLOR_HSV2BGR)[0]
+
+
+PALETTE = create_palette()
+
+
+def draw_detections(image, boxes, scores=None, classes=None, masks=None, class_names: Sequence[str] = None,
+                    alpha=0.5, thickness=2, font_scale=0.5):
+    """
+    Draw boxes, labels and masks on a copy of a BGR image with NumPy and OpenCV only. All masks are blended in a
+        single vectorized pass, where a later mask covers an earlier one. Safe to call from many threads at once.
+
+    :param boxes: (N, 4) array of x1, y1, x2, y2.
+    :param scores: (N,) array of scores or None.
+    :param classes: (N,) array of class ids or None.
+    :param masks: (N, H, W) boolean array with the size of the image or None.
+    :param class_names: The names of the class ids, the class id is shown when not given.
+    :param alpha: The opacity of the masks.
+    """
+    output = image.copy()
+    if boxes is None:
+        return output
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) == 0:
+        return output
+    classes = np.zeros(len(boxes), dtype=np.int64) if classes is None else np.asarray(classes, dtype=np.int64)
+    colors = PALETTE[classes % len(PALETTE)]
+
+    if masks is not None and len(masks) > 0:
+        # Label map with the (1-based) index of the last mask that covers each pixel, at most 255 masks
+        masks = np.ascontiguousarray(masks[-255:], dtype=bool).view(np.uint8)
+        labels = np.zeros(masks.shape[1:], dtype=np.uint8)
+        for i, mask in enumerate(masks):
+            cv2.max(labels, mask * np.uint8(i + 1), dst=labels)
+        lut = np.zeros((256, 1, 3), dtype=np.uint8)
+        lut[1:len(masks) + 1, 0] = colors[-len(masks):]
+        layer = cv2.LUT(cv2.merge([labels, labels, labels]), lut)
+        blended = cv2.addWeighted(output, 1 - alpha, layer, alpha, 0)
+        cv2.copyTo(blended, (labels > 0).view(np.uint8), output)
+
+    for i, (x1, y1, x2, y2) in enumerate(boxes.astype(np.int32)):
+        color = tuple(int(c) for c in colors[i])
+        cv2.rectangle(output, (x1, y1), (x2, y2), color, thickness)
+        label = class_names[classes[i]] if class_names is not None and classes[i] < len(class_names) \
+            else str(classes[i])
+        if scores is not None:
+            label = f"{label} {scores[i] * 100:.0f}%"
+        (w, h), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+        y = max(y1, h + baseline)
+        cv2.rectangle(output, (x1, y - h - baseline), (x1 + w, y), color, -1)
+        cv2.putText(output, label, (x1, y - baseline), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), 1,
+                    cv2.LINE_AA)
+    return output
+
+
+def mmdet_to_arrays(result, score_thr=0.3):
+    """
+    Convert an mmdet 2.x result (a list of (n, 5) arrays per class, or a (bbox_result, segm_result) tuple) to the
+        boxes, scores, classes and masks of draw_detections. Detections below score_thr are dropped like in
+        show_result.
+    """
+    if isinstance(result, tuple):
+        bbox_result, segm_result = result[:2]
+        if isinstance(segm_result, tuple):
+            segm_result = segm_result[0]
+    else:
+        bbox_result, segm_result = result, None
+    bboxes = np.vstack(bbox_result) if len(bbox_result) > 0 else np.zeros((0, 5), np.float32)
+    classes = np.concatenate([np.full(len(b), i, dtype=np.int64) for i, b in enumerate(bbox_result)]) \
+        if len(bbox_result) > 0 else np.zeros(0, np.int64)
+    keep = bboxes[:, 4] >= score_thr
+    masks = None
+    if segm_result is not None:
+        segms = [segm for class_segms in segm_result for segm in class_segms]
+        if len(segms) > 0:
+            masks = np.stack(segms)[keep]
+    return bboxes[keep, :4], bboxes[keep, 4], classes[keep], masks
@@ -0,0 +1,57 @@
+from threading import Lock
+from typing import Any, Callable, Hashable
+
+
+class SharedModel:
+    def __init__(self, key: Hashable, model: Any):
+        """
+        A model in the ModelRegistry. Use the lock around calls to the model when it is shared between threads.
+        """
+        self.key = key
+        self.model = model
+        self.lock = Lock()
+        self.refs = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
+
+
+class ModelRegistry:
+    def __init__(self):
+        """
+        Keeps one instance per model key in this process, so elements that are constructed with the same config,
+            weights and device share the weights instead of loading them again.
+        """
+        self.lock = Lock()
+        self.models = {}
+
+    def acquire(self, key: Hashable, create: Callable[[], Any]) -> SharedModel:
+        """
+        :param key: The identity of the model, e.g. (config, weights, device).
+        :param create: Creates the model if there is no model for key yet.
+        :return: The shared model, release it when it is no longer used.
+        """
+        with self.lock:
+            shared = self.models.get(key)
+            if shared is None:
+                shared = SharedModel(key, create())
+                self.models[key] = shared
+            else:
+                print(f"Reusing model {key[:3]}")
+            shared.refs += 1
+            return shared
+
+    def release(self, shared: SharedModel):
+        with self.lock:
+            shared.refs -= 1
+            if shared.refs <= 0 and self.models.get(shared.key) is shared:
+                del self.models[shared.key]
+
+
+registry = ModelRegistry()
@@ -0,0 +1,202 @@
+from typing import Any, List
+from utils import as_captures
+from .overlay import draw_detections
+from .detections import Detections
+import math
+import time
+import numpy as np
+
+
+def tile_positions(length, tile, overlap):
+    """
+    :return: The start positions of tiles of size tile that cover length with at least overlap pixels of overlap.
+    """
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+
+def nms(boxes, scores, classes, threshold=0.5, metric="ios"):
+    """
+    Class aware greedy non-maximum suppression.
+
+    :param metric: "iou" (intersection over union) or "ios" (intersection over the smaller box), which also
+        suppresses the partial boxes of an object that was cut by a tile border.
+    :return: The indices of the kept boxes, by descending score.
+    """
+    order = np.argsort(-scores)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while len(order) > 0:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        w = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+        h = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+        intersection = w * h
+        if metric == "iou":
+            overlap = intersection / np.maximum(areas[i] + areas[rest] - intersection, 1e-6)
+        else:
+            overlap = intersection / np.maximum(np.minimum(areas[i], areas[rest]), 1e-6)
+        order = rest[(overlap < threshold) | (classes[rest] != classes[i])]
+    return np.array(keep, dtype=np.int64)
+
+
+class Tiled:
+
+    def __init__(self, detector, input_idx=-1, tile_size=640, overlap=0.2, max_tiles=16, nms_threshold=0.5,
+                 nms_metric="ios", output_detections=False, alpha=0.5):
+        """
+        Runs the detector (e.g. Detectron2 or MMDetect) on overlapping tiles of the frame in one batch, so small
+            objects keep their resolution, and merges the detections of all tiles with cross-tile NMS. The output has
+            the same layout as the detector: an optional Detections record followed by the image rendered with the
+            overlay renderer.
+
+        :param detector: A processor with a detect_batch(images) method that returns a list of Detections.
+        :param tile_size: The width and height of a tile in pixels.
+        :param overlap: The minimum overlap of neighbouring tiles as a fraction of tile_size.
+        :param max_tiles: The maximum number of tiles per frame, the tiles are enlarged to stay within this budget.
+        :param nms_threshold: Detections of the same class that overlap more than this are merged.
+        :param nms_metric: "ios" (intersection over the smaller box) or "iou".
+        :param output_detections: Also append a Detections record to the captures, before the rendered image. Wrap
+            the element in a Buffer with default_idx=[None, -2] then, so the layout does not change while there is
+            no result yet.
+        :param alpha: The opacity of the masks.
+        """
+        if max_tiles < 1:
+            raise ValueError(f"max_tiles must be at least 1, got {max_tiles}")
+        self.detector = detector
+        self.input_idx = input_idx
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.max_tiles = max_tiles
+        self.nms_threshold = nms_threshold
+        self.nms_metric = nms_metric
+        self.output_detections = output_detections
+        self.alpha = alpha
+
+        self.frames = 0
+        self.tiles = 0
+        self.latency = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+        self.input = None
+        self.last_outputs = None
+
+        self.prev = None
+        self.next = None
+
+    def tile_grid(self, width, height):
+        """
+        :return: The (x, y, size) of the tiles of a frame, within the max_tiles budget.
+        """
+        size = self.tile_size
+        while True:
+            overlap = int(size * self.overlap)
+            xs = tile_positions(width, size, overlap)
+            ys = tile_positions(height, size, overlap)
+            if len(xs) * len(ys) <= self.max_tiles:
+                return [(x, y, size) for y in ys for x in xs]
+            size = int(size * 1.25)
+
+    def detect_arrays(self, image):
+        """
+        :return: The merged boxes, scores, classes, masks (or None) and class names of the tiles of image.
+        """
+        height, width = image.shape[:2]
+        grid = self.tile_grid(width, height)
+        tiles = [image[y:y + size, x:x + size] for x, y, size in grid]
+        results = self.detector.detect_batch(tiles)
+
+        boxes, scores, classes, masks = [], [], [], []
+        class_names = None
+        for (x, y, _), detections in zip(grid, results):
+            if len(detections) == 0:
+                continue
+            class_names = detections.class_names
+            boxes.append(detections.boxes + np.float32([x, y, x, y]))
+            scores.append(detections.scores)
+            classes.append(detections.classes)
+            if detections.masks is not None:
+                masks.append((x, y, detections.decode_masks()))
+        self.tiles += len(grid)
+        if not boxes:
+            return np.zeros((0, 4), dtype=np.float32), None, None, None, class_names
+
+        boxes, scores, classes = np.concatenate(boxes), np.concatenate(scores), np.concatenate(classes)
+        keep = nms(boxes, scores, classes, self.nms_threshold, self.nms_metric)
+        frame_masks = None
+        if masks and sum(len(m) for _, _, m in masks) == len(boxes):
+            # Paste the tile masks of the kept detections into full frame masks
+            tile_masks = [(x, y, mask) for x, y, tile_masks in masks for mask in tile_masks]
+            frame_masks = np.zeros((len(keep), height, width), dtype=bool)
+            for i, k in enumerate(keep):
+                x, y, mask = tile_masks[k]
+                frame_masks[i, y:y + mask.shape[0], x:x + mask.shape[1]] = mask
+        return boxes[keep], scores[keep], classes[keep], frame_masks, class_names
+
+    def detect(self, image) -> Detections:
+        return Detections.from_arrays(*self.detect_arrays(image))
+
+    def detect_batch(self, images) -> List[Detections]:
+        return [self.detect(image) for image in images]
+
+    def process_image(self, image):
+        """
+        :return: The Detections (None if output_detections is False) and the rendered image.
+        """
+        start = time.perf_counter()
+        boxes, scores, classes, masks, class_names = self.detect_arrays(image)
+        rendered = draw_detections(image, boxes, scores, classes, masks, class_names, alpha=self.alpha)
+        detections = Detections.from_arrays(boxes, scores, classes, masks, class_names) \
+            if self.output_detections else None
+        self.latency = time.perf_counter() - start
+        self.total_latency += self.latency
+        self.max_latency = max(self.max_latency, self.latency)
+        self.frames += 1
+        return detections, rendered
+
+    def stats(self):
+        """
+        :return: The number of processed frames, the mean number of tiles per frame and the last, mean and maximum
+            latency per frame in milliseconds (detection, merging and rendering).
+        """
+        frames = max(self.frames, 1)
+        return {"frames": self.frames, "tiles_per_frame": self.tiles / frames, "last_ms": self.latency * 1e3,
+                "mean_ms": self.total_latency / frames * 1e3, "max_ms": self.max_latency * 1e3}
+
+    def __call__(self, captures: List[Any]) -> List[Any]:
+        if self.prev:
+            captures = self.prev([])
+        captures = as_captures(captures)
+        frame = captures.frame(self.input_idx)
+        if frame.image is None:
+            if self.output_detections:
+                captures.append(None)
+            captures.append(None)
+            return captures
+
+        if frame is self.input:
+            # The same frame again (e.g. pulled twice), return the same outputs
+            captures.extend(self.last_outputs)
+            return captures
+        if captures.reuse_outputs(frame, self.last_outputs):
+            return captures
+        num_caps = len(captures)
+        detections, rendered = self.process_image(frame.image)
+        if self.output_detections:
+            captures.append(frame.derive(detections))
+        captures.append(frame.derive(rendered))
+        self.last_outputs = captures.outputs_since(num_caps)
+        self.input = frame
+        return captures
+
+    def start(self, block: bool = False):
+        self.detector.start(block)
+
+    def stop(self):
+        self.detector.stop()
+
+    def wait(self, timeout=3):
+        return self.detector.wait(timeout)
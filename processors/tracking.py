@@ -0,0 +1,185 @@
+from typing import Any, List
+from utils import as_captures
+from .overlay import draw_detections
+from .detections import Detections
+import cv2
+import numpy as np
+
+
+class KeyframeTracker:
+
+    def __init__(self, detector, input_idx=-1, interval=5, redetect_on_lost=True, grid=8, fb_threshold=1.0,
+                 min_points=6, output_detections=False, alpha=0.5):
+        """
+        Runs the detector (e.g. Detectron2 or MMDetect) only on keyframes, every interval frames or when a tracked
+            object is lost. In between the boxes and masks are propagated with median flow: pyramidal Lucas-Kanade
+            optical flow on a grid of points per box, filtered by the forward-backward error, gives the median
+            translation and scale of each box. The output has the same layout as the detector: an optional
+            Detections record followed by the image rendered with the overlay renderer.
+
+        :param detector: A processor with a detect(image) method that returns Detections.
+        :param interval: The maximum number of frames between two detector runs.
+        :param redetect_on_lost: Run the detector on the next frame when a tracked object is lost.
+        :param grid: The number of tracked points per box is grid x grid.
+        :param fb_threshold: The maximum forward-backward error in pixels of a tracked point.
+        :param min_points: A box with fewer good points than this is lost.
+        :param output_detections: Also append a Detections record to the captures, before the rendered image. Wrap
+            the element in a Buffer with default_idx=[None, -2] then, so the layout does not change while there is
+            no result yet.
+        :param alpha: The opacity of the masks.
+        """
+        self.detector = detector
+        self.input_idx = input_idx
+        self.interval = interval
+        self.redetect_on_lost = redetect_on_lost
+        self.grid = grid
+        self.fb_threshold = fb_threshold
+        self.min_points = min_points
+        self.output_detections = output_detections
+        self.alpha = alpha
+
+        self.gray = None
+        self.boxes = None
+        self.scores = None
+        self.classes = None
+        self.masks = None
+        self.class_names = None
+        self.since_keyframe = 0
+        self.lost = False
+        self.frames = 0
+        self.keyframes = 0
+
+        self.input = None
+        self.last_outputs = None
+
+        self.prev = None
+        self.next = None
+
+    def detect(self, image, gray):
+        detections = self.detector.detect(image)
+        self.boxes = detections.boxes
+        self.scores = detections.scores
+        self.classes = detections.classes
+        self.masks = detections.decode_masks()
+        self.class_names = detections.class_names
+        self.gray = gray
+        self.since_keyframe = 0
+        self.lost = False
+        self.keyframes += 1
+
+    def track(self, gray):
+        """
+        Move the boxes (and masks) from the previous frame to gray with median flow, lost boxes are removed.
+        """
+        if len(self.boxes) > 0:
+            steps = (np.arange(self.grid, dtype=np.float32) + 0.5) / self.grid
+            x1, y1, x2, y2 = (self.boxes[:, i, None, None] for i in range(4))
+            xs = x1 + (x2 - x1) * steps[None, None, :]
+            ys = y1 + (y2 - y1) * steps[None, :, None]
+            xs, ys = np.broadcast_arrays(xs, ys)
+            p0 = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2).astype(np.float32)
+
+            p1, status, _ = cv2.calcOpticalFlowPyrLK(self.gray, gray, p0, None, winSize=(15, 15), maxLevel=2)
+            p0r, status_back, _ = cv2.calcOpticalFlowPyrLK(gray, self.gray, p1, None, winSize=(15, 15), maxLevel=2)
+            fb_error = np.linalg.norm((p0 - p0r).reshape(-1, 2), axis=1)
+            good = (status.ravel() == 1) & (status_back.ravel() == 1) & (fb_error < self.fb_threshold)
+
+            n = self.grid * self.grid
+            p0 = p0.reshape(-1, n, 2)
+            p1 = p1.reshape(-1, n, 2)
+            good = good.reshape(-1, n)
+            height, width = gray.shape[:2]
+            keep = np.zeros(len(self.boxes), dtype=bool)
+            boxes = self.boxes.copy()
+            masks = [] if self.masks is not None else None
+            for i in range(len(self.boxes)):
+                if good[i].sum() < self.min_points:
+                    continue
+                a, b = p0[i][good[i]], p1[i][good[i]]
+                shift = np.median(b - a, axis=0)
+                ca, cb = np.median(a, axis=0), np.median(b, axis=0)
+                da = np.linalg.norm(a - ca, axis=1)
+                db = np.linalg.norm(b - cb, axis=1)
+                valid = da > 1e-3
+                scale = float(np.median(db[valid] / da[valid])) if valid.any() else 1.0
+
+                center = (self.boxes[i, :2] + self.boxes[i, 2:]) / 2
+                half = (self.boxes[i, 2:] - self.boxes[i, :2]) / 2 * scale
+                box = np.concatenate([center + shift - half, center + shift + half])
+                box = np.clip(box, 0, [width, height, width, height])
+                if box[2] - box[0] < 2 or box[3] - box[1] < 2:
+                    continue
+                keep[i] = True
+                boxes[i] = box
+                if masks is not None:
+                    # x' = scale * (x - center) + center + shift
+                    m = np.float32([[scale, 0, (1 - scale) * center[0] + shift[0]],
+                                    [0, scale, (1 - scale) * center[1] + shift[1]]])
+                    masks.append(cv2.warpAffine(self.masks[i].view(np.uint8), m, (width, height),
+                                                flags=cv2.INTER_NEAREST).view(bool))
+
+            self.lost = not keep.all()
+            self.boxes = boxes[keep]
+            self.scores = self.scores[keep]
+            self.classes = self.classes[keep]
+            if masks is not None:
+                self.masks = np.stack(masks) if masks else None
+        self.gray = gray
+        self.since_keyframe += 1
+
+    def process_image(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if self.gray is None or self.gray.shape != gray.shape or self.since_keyframe + 1 >= self.interval or \
+                (self.redetect_on_lost and self.lost):
+            self.detect(image, gray)
+        else:
+            self.track(gray)
+        self.frames += 1
+        rendered = draw_detections(image, self.boxes, self.scores, self.classes, self.masks, self.class_names,
+                                   alpha=self.alpha)
+        return rendered
+
+    def detections(self) -> Detections:
+        return Detections.from_arrays(self.boxes, self.scores, self.classes, self.masks, self.class_names)
+
+    def stats(self):
+        """
+        :return: The number of processed frames, detector runs and the fraction of frames that ran the detector.
+        """
+        return {"frames": self.frames, "keyframes": self.keyframes,
+                "detector_load": self.keyframes / self.frames if self.frames else 0.0}
+
+    def __call__(self, captures: List[Any]) -> List[Any]:
+        if self.prev:
+            captures = self.prev([])
+        captures = as_captures(captures)
+        frame = captures.frame(self.input_idx)
+        if frame.image is None:
+            if self.output_detections:
+                captures.append(None)
+            captures.append(None)
+            return captures
+
+        if frame is self.input:
+            # The same frame again (e.g. pulled twice), return the same outputs
+            captures.extend(self.last_outputs)
+            return captures
+        if captures.reuse_outputs(frame, self.last_outputs):
+            return captures
+        num_caps = len(captures)
+        rendered = self.process_image(frame.image)
+        if self.output_detections:
+            captures.append(frame.derive(self.detections()))
+        captures.append(frame.derive(rendered))
+        self.last_outputs = captures.outputs_since(num_caps)
+        self.input = frame
+        return captures
+
+    def start(self, block: bool = False):
+        self.detector.start(block)
+
+    def stop(self):
+        self.detector.stop()
+
+    def wait(self, timeout=3):
+        return self.detector.wait(timeout)
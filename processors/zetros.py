@@ -1,14 +1,133 @@
 from typing import Any, List
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-import urllib.request
+from threading import Thread, Condition
+from urllib.parse import urlsplit
+import http.client
+import time
 
-from utils import text_box, ALIGNMENT_LEFT, ALIGNMENT_TOP, ALIGNMENT_CENTER, Buffer
+from utils import text_box, ALIGNMENT_LEFT, ALIGNMENT_TOP, ALIGNMENT_CENTER, Buffer, as_captures
+
+# The words parse_direction looks for
+DIRECTION_WORDS = ("left", "right", "center", "backward")
+
+
+class CommandDispatcher:
+    def __init__(self, host, timeout=2.0):
+        """
+        Sends commands (GET host/command) from a background thread over a persistent keep-alive connection, so the
+            pipeline never waits for the robot. Commands are coalesced: while a command is in flight only the newest
+            pending command is kept and sent next.
+
+        :param host: The url of the robot, e.g. http://10.13.13.108:5000.
+        :param timeout: The socket timeout in seconds of a command.
+        """
+        url = urlsplit(host)
+        self.hostname = url.hostname
+        self.port = url.port or 80
+        self.path = url.path.rstrip("/") + "/"
+        self.timeout = timeout
+        self.connection = None
+
+        self.condition = Condition()
+        self.pending = None
+        self.terminate = False
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.latency = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.thread = Thread(target=self.update, args=())
+        self.thread.daemon = True
+
+    def send(self, command: str):
+        """
+        Queue a command without blocking, it replaces a pending command that was not sent yet.
+        """
+        with self.condition:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = command
+            self.condition.notify_all()
+        if not self.thread.is_alive() and not self.terminate:
+            self.start()
+
+    def dispatch(self, command: str) -> bool:
+        start = time.perf_counter()
+        for attempt in range(2):
+            reused = self.connection is not None
+            try:
+                if self.connection is None:
+                    self.connection = http.client.HTTPConnection(self.hostname, self.port, timeout=self.timeout)
+                self.connection.request("GET", self.path + command, headers={"Connection": "keep-alive"})
+                response = self.connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    raise http.client.HTTPException(f"HTTP {response.status}")
+                self.latency = time.perf_counter() - start
+                self.total_latency += self.latency
+                self.max_latency = max(self.max_latency, self.latency)
+                self.sent += 1
+                return True
+            except (OSError, http.client.HTTPException) as e:
+                if self.connection is not None:
+                    self.connection.close()
+                self.connection = None
+                # Retry once if the robot closed the idle keep-alive connection, but never after a timeout
+                stale = isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError))
+                if attempt == 0 and reused and stale:
+                    continue
+                self.failed += 1
+                print(f"Command {command} to {self.hostname}:{self.port} failed: {e}")
+                return False
+
+    def update(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None or self.terminate)
+                if self.terminate:
+                    break
+                command, self.pending = self.pending, None
+            self.dispatch(command)
+        if self.connection is not None:
+            self.connection.close()
+        print(f"Stopped thread {self.__class__} {id(self)}")
+
+    def stats(self):
+        """
+        :return: The number of sent, failed and coalesced (never sent) commands and the last, mean and maximum
+            latency in milliseconds.
+        """
+        with self.condition:
+            return {"sent": self.sent, "failed": self.failed, "coalesced": self.coalesced,
+                    "last_ms": self.latency * 1e3,
+                    "mean_ms": self.total_latency / self.sent * 1e3 if self.sent else 0.0,
+                    "max_ms": self.max_latency * 1e3}
+
+    def start(self, block: bool = False):
+        if not self.thread.is_alive():
+            self.thread.start()
+        if block:
+            self.wait()
+
+    def stop(self):
+        with self.condition:
+            self.terminate = True
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        if self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+        return self.thread.is_alive()
 
 
 class LegoZetros:
 
-    def __init__(self, host, image_idx=-1, text_idx=-2, dummy=False, only_when_updated=True):
+    def __init__(self, host, image_idx=-1, text_idx=-2, dummy=False, only_when_updated=True, timeout=2.0):
+        """
+        :param timeout: The timeout in seconds of a command, commands are sent by a CommandDispatcher.
+        """
         self.host = host
         self.image_idx = image_idx
         self.text_idx = text_idx
@@ -17,6 +136,7 @@ class LegoZetros:
         self.prev = None
         self.next = None
         self.last_input_text = ""
+        self.dispatcher = CommandDispatcher(host, timeout) if not dummy else None
 
     def draw_text(self, image, text):
         draw = ImageDraw.Draw(image)
@@ -54,6 +174,7 @@ class LegoZetros:
     def __call__(self, captures: List[Any]) -> List[Any]:
         if self.prev:
             captures = self.prev([])
+        captures = as_captures(captures)
         input_image = captures[self.image_idx].copy()
         input_text = captures[self.text_idx]
         if input_text is not None and input_image is not None:
@@ -61,20 +182,27 @@ class LegoZetros:
             overlay_image = self.overlay_answer(input_image, direction)
             if not self.dummy:
                 if self.should_update(input_text): # do not actually move if the buffer is not updated
-                    urllib.request.urlopen(self.host + "/" + direction)
+                    self.dispatcher.send(direction)
                     self.last_input_text = input_text
-            captures.append(overlay_image)
-            captures.append(direction)
+            captures.derive(self.image_idx, overlay_image)
+            captures.derive(self.image_idx, direction)
         else:
             captures.append(None)
             captures.append("None")
         return captures
 
+    def stats(self):
+        return self.dispatcher.stats() if self.dispatcher is not None else {}
+
     def start(self, block: bool = False):
-        return
+        if self.dispatcher is not None:
+            self.dispatcher.start()
 
     def stop(self):
-        return
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
 
     def wait(self, timeout=3):
+        if self.dispatcher is not None:
+            return self.dispatcher.wait(timeout)
         return False
@@ -0,0 +1,58 @@
+import time
+import numpy as np
+import pytest
+import utils  # noqa: F401, sets the spawn start method like the pipelines do
+from processors.batching import InferenceServer
+
+
+class SumProcessor:
+    """
+    A CPU processor that sums the images of a batch and fails on negative images.
+    """
+    def __init__(self, fail_on_start=False):
+        if fail_on_start:
+            raise RuntimeError("No device")
+
+    def start(self):
+        return
+
+    def process_batch(self, images):
+        if any(image.min() < 0 for image in images):
+            raise ValueError("Negative image")
+        return [int(image.sum()) for image in images]
+
+
+@pytest.fixture
+def server():
+    server = InferenceServer(SumProcessor, max_batch=2)
+    yield server
+    server.stop()
+    assert not server.wait(timeout=10)
+
+
+def test_results_are_returned_to_their_client(server):
+    clients = [server.client(timeout=30), server.client(timeout=30)]
+    server.start()
+    assert clients[0].infer(np.ones((2, 2))) == 4
+    assert clients[1].infer(np.full((2, 2), 2)) == 8
+
+
+def test_failed_batch_answers_none_and_the_server_continues(server):
+    client = server.client(timeout=30)
+    server.start()
+    start = time.time()
+    assert client.infer(-np.ones((2, 2))) is None
+    assert time.time() - start < 10
+    assert client.infer(np.ones((2, 2))) == 4
+
+
+def test_clients_fail_fast_when_the_server_died():
+    server = InferenceServer(SumProcessor, fail_on_start=True)
+    client = server.client(timeout=30)
+    server.start()
+    start = time.time()
+    assert client.infer(np.ones((2, 2))) is None
+    assert time.time() - start < 10
+    assert not server.wait(timeout=10)
+    # A stopped server is detected before the request is sent
+    assert client.infer(np.ones((2, 2))) is None
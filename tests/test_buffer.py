@@ -0,0 +1,44 @@
+import threading
+import numpy as np
+from utils import Buffer, Captures, Frame
+
+
+class Blocked:
+    """
+    An element that does not produce a result until it is released.
+    """
+    def __init__(self):
+        self.release = threading.Event()
+        self.prev = None
+        self.next = None
+
+    def __call__(self, captures):
+        self.release.wait()
+        captures = Captures(captures)
+        captures.append(np.ones(2))
+        return captures
+
+    def start(self, block=False):
+        return
+
+    def stop(self):
+        self.release.set()
+
+    def wait(self, timeout=3):
+        return False
+
+
+def test_placeholders_are_created_once_per_input():
+    buffer = Buffer(Blocked(), use_mp=False)
+    buffer.start()
+    try:
+        frame = Frame(np.zeros(2))
+        first = buffer(Captures([frame]))
+        second = buffer(Captures([frame]))
+        assert first.frame(-1).stale
+        assert first.frame(-1) is second.frame(-1)
+        third = buffer(Captures([Frame(np.zeros(2))]))
+        assert third.frame(-1) is not second.frame(-1)
+    finally:
+        buffer.stop()
+        buffer.wait()
@@ -0,0 +1,25 @@
+import numpy as np
+from utils import Captures, Frame, SBS, Inlay, CanvasBuffers
+
+
+def test_sbs_and_inlay_keep_outputs_that_consumers_hold():
+    for element in (SBS(-1, -2, factor=1), Inlay(-1, -2)):
+        outputs = []
+        for value in range(3):
+            image = np.full((48, 64, 3), value, dtype=np.uint8)
+            outputs.append(element(Captures([Frame(image), Frame(image.copy())]))[-1])
+        assert [int(output[-1, -1, 0]) for output in outputs] == [0, 1, 2]
+
+
+def test_canvas_buffers_reuse_released_canvases_only():
+    canvases = CanvasBuffers(count=2)
+    first, new = canvases.get((4, 4, 3))
+    assert new
+    second, new = canvases.get((4, 4, 3))
+    assert new and second.base is not first.base
+    canvases.release(first)
+    third, new = canvases.get((4, 4, 3))
+    assert not new and third.base is first.base
+    # Both pooled buffers are handed out, the next canvas is allocated outside the pool
+    fourth, new = canvases.get((4, 4, 3))
+    assert new and len(canvases.buffers) == 2
@@ -0,0 +1,18 @@
+from utils import Captures, Frame
+
+
+def test_reuse_outputs_only_for_unchanged_frames():
+    captures = Captures([Frame("input", seq=1)])
+    assert not captures.reuse_outputs(captures.frame(-1), None)
+    captures.append("output")
+    outputs = captures.outputs_since(1)
+    assert [frame.image for frame in outputs] == ["output"]
+    assert not any(frame.changed for frame in outputs)
+
+    changed = Captures([Frame("input", seq=2)])
+    assert not changed.reuse_outputs(changed.frame(-1), outputs)
+    assert len(changed) == 1
+
+    unchanged = Captures([Frame("input", seq=2).unchanged()])
+    assert unchanged.reuse_outputs(unchanged.frame(-1), outputs)
+    assert unchanged.frame(-1) is outputs[0]
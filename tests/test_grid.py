@@ -0,0 +1,50 @@
+import numpy as np
+from utils import Captures, Frame, Grid
+
+
+class Source:
+    def __init__(self, value=0, shape=(48, 64, 3)):
+        self.shape = shape
+        self.set(value)
+
+    def set(self, value):
+        self.frame = Frame(np.full(self.shape, value, dtype=np.uint8))
+
+    def __call__(self, captures):
+        return Captures([self.frame])
+
+
+def pull(element, sources, value):
+    for source in sources:
+        source.set(value)
+    return element([]).frame(-1).image
+
+
+def test_grid_keeps_outputs_that_consumers_hold():
+    sources = [Source() for _ in range(4)]
+    grid = Grid(sources, rows=2, cols=2)
+    # Two consumers (e.g. a viewer and an outer Grid) each hold an output while the grid keeps producing
+    first = pull(grid, sources, 1)
+    second = pull(grid, sources, 2)
+    expected = first.copy(), second.copy()
+    for value in range(3, 10):
+        latest = pull(grid, sources, value)
+        assert latest[0, 0, 0] == value
+    assert np.array_equal(first, expected[0])
+    assert np.array_equal(second, expected[1])
+
+
+def test_grid_reuses_canvases_that_are_released():
+    sources = [Source() for _ in range(4)]
+    grid = Grid(sources, rows=2, cols=2)
+    addresses = {pull(grid, sources, value).ctypes.data for value in range(10)}
+    assert len(addresses) <= 2
+
+
+def test_nested_grid_reuses_inner_canvases():
+    sources = [Source() for _ in range(2)]
+    inner = Grid(sources, rows=1, cols=2)
+    outer = Grid([inner], rows=1, cols=1)
+    for value in range(10):
+        assert pull(outer, sources, value)[0, 0, 0] == value
+    assert len(inner.canvases.buffers) <= 2
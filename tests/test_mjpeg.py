@@ -0,0 +1,73 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+import pytest
+from capture.mjpeg import MJPEGHTTPCapture
+
+JPG = cv2.imencode(".jpg", np.full((480, 640, 3), 128, dtype=np.uint8))[1].tobytes()
+
+
+class StubCamera(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/capture":
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(JPG)))
+            self.end_headers()
+            self.wfile.write(JPG)
+        elif self.path == "/stream":
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            self.end_headers()
+            for _ in range(3):
+                self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " +
+                                 str(len(JPG)).encode() + b"\r\n\r\n" + JPG + b"\r\n")
+            self.close_connection = True
+        else:
+            body = b"Service Unavailable"
+            self.send_response(503)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        return
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCamera)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("path", ["/capture", "/stream"])
+def test_jpgs_are_decoded(server, path):
+    capture = MJPEGHTTPCapture(server + path, width=320, poll_interval=0.01)
+    capture.start()
+    try:
+        frame = capture([]).frame(-1)
+        assert frame.image.shape == (240, 320, 3)
+        assert capture.stats()["received"] >= 1
+    finally:
+        capture.stop()
+        assert not capture.wait(timeout=3)
+
+
+def test_error_status_reconnects(server):
+    capture = MJPEGHTTPCapture(server + "/missing")
+    capture.start()
+    try:
+        capture.thread.join(timeout=0.3)
+        stats = capture.stats()
+        assert stats["reconnects"] >= 1 and stats["received"] == 0
+    finally:
+        capture.stop()
+        assert not capture.wait(timeout=3)
@@ -0,0 +1,57 @@
+import threading
+import numpy as np
+from capture.opencv import OpenCVCapture
+
+
+class FakeVideoCapture:
+    def __init__(self, success=True, frames=None):
+        self.success = success
+        self.frames = frames
+        self.reads = 0
+        self.read_event = threading.Event()
+        self.closed = threading.Event()
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.frames is not None and self.reads >= self.frames:
+            # No new frames, like a camera that stalls
+            self.closed.wait()
+        self.reads += 1
+        self.read_event.set()
+        return self.success, np.zeros((1536, 2048, 3), dtype=np.uint8) if self.success else None
+
+    def release(self):
+        self.closed.set()
+
+
+def create_capture(video_capture):
+    capture = OpenCVCapture("missing.mp4", threaded=True)
+    capture.capture = video_capture
+    return capture
+
+
+def test_only_returned_frames_are_resized():
+    video_capture = FakeVideoCapture(frames=1)
+    capture = create_capture(video_capture)
+    capture.start()
+    try:
+        first = capture([]).frame(-1)
+        assert first.image.shape == (768, 1024, 3)
+        # No new frame was grabbed in between, the same processed frame is returned
+        assert capture([]).frame(-1) is first
+    finally:
+        capture.stop()
+        video_capture.release()
+        capture.wait(timeout=3)
+
+
+def test_stop_ends_the_reconnect_loop(monkeypatch):
+    video_capture = FakeVideoCapture(success=False)
+    monkeypatch.setattr("capture.opencv.cv2.VideoCapture", lambda src: video_capture)
+    capture = create_capture(video_capture)
+    capture.start()
+    assert video_capture.read_event.wait(timeout=3)
+    capture.stop()
+    assert not capture.wait(timeout=3)
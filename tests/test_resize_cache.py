@@ -0,0 +1,25 @@
+import numpy as np
+from utils import Frame, ResizeCache
+
+
+def test_only_repeated_resizes_are_cached():
+    cache = ResizeCache()
+    frame = Frame(np.random.default_rng(0).integers(0, 255, (64, 96, 3), dtype=np.uint8))
+    outputs = [np.zeros((32, 48, 3), dtype=np.uint8) for _ in range(3)]
+    cache.resize_into(frame, outputs[0])
+    assert cache.stats()["entries"] == 0
+    cache.resize_into(frame, outputs[1])
+    assert cache.stats()["entries"] == 1
+    cache.resize_into(frame, outputs[2])
+    assert cache.stats()["hits"] == 1
+    assert np.array_equal(outputs[0], outputs[1]) and np.array_equal(outputs[1], outputs[2])
+
+
+def test_entries_are_dropped_with_their_frame():
+    cache = ResizeCache()
+    frame = Frame(np.zeros((64, 96, 3), dtype=np.uint8))
+    for _ in range(2):
+        cache.resize_into(frame, np.zeros((32, 48, 3), dtype=np.uint8))
+    del frame
+    cache.resize_into(Frame(np.zeros((64, 96, 3), dtype=np.uint8)), np.zeros((32, 48, 3), dtype=np.uint8))
+    assert cache.stats()["entries"] == 0 and len(cache.seen) == 1
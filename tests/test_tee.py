@@ -0,0 +1,41 @@
+from utils import Captures, Frame, Tee
+
+
+class Source:
+    def __init__(self):
+        self.frame = Frame("image", seq=0)
+        self.pulls = 0
+
+    def __call__(self, captures):
+        self.pulls += 1
+        return Captures([self.frame])
+
+
+def test_unchanged_frame_is_published_once():
+    source = Source()
+    tee = Tee(source)
+    a, b = tee.subscribe("a"), tee.subscribe("b")
+    for _ in range(5):
+        a([])
+    b([])
+    stats = tee.stats()
+    assert tee.seq == 1
+    assert stats["a"] == {"seq": 1, "lag": 0, "received": 1, "dropped": 0}
+    assert stats["b"] == {"seq": 1, "lag": 0, "received": 1, "dropped": 0}
+    assert source.pulls == 5
+
+
+def test_new_frames_are_counted_and_dropped():
+    source = Source()
+    tee = Tee(source)
+    a, b = tee.subscribe("a"), tee.subscribe("b")
+    a([])
+    b([])
+    for seq in range(1, 4):
+        source.frame = Frame("image", seq=seq)
+        assert a([]).frame(-1) is source.frame
+    b([])
+    stats = tee.stats()
+    assert tee.seq == 4
+    assert stats["a"]["received"] == 4 and stats["a"]["dropped"] == 0
+    assert stats["b"]["received"] == 2 and stats["b"]["dropped"] == 2
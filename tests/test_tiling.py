@@ -0,0 +1,30 @@
+import pytest
+from processors.tiling import Tiled
+from utils import Captures, Frame
+
+
+def test_max_tiles_must_be_positive():
+    for max_tiles in (0, -1):
+        with pytest.raises(ValueError):
+            Tiled(detector=None, max_tiles=max_tiles)
+
+
+def test_tile_grid_stays_within_max_tiles():
+    tiled = Tiled(detector=None, tile_size=256, max_tiles=1)
+    grid = tiled.tile_grid(1920, 1080)
+    assert len(grid) == 1
+    x, y, size = grid[0]
+    assert (x, y) == (0, 0) and size >= 1920
+
+
+def test_outputs_are_reused_while_unchanged():
+    tiled = Tiled(detector=None, output_detections=False)
+    calls = []
+    tiled.process_image = lambda image: calls.append(image) or (None, image + "-rendered")
+    first = tiled(Captures([Frame("image", seq=0)]))
+    assert first.frame(-1).image == "image-rendered" and first.frame(-1).changed
+    gated = Frame("image", seq=1).unchanged()
+    second = tiled(Captures([gated]))
+    assert len(calls) == 1
+    # The reused outputs are marked unchanged so the elements behind Tiled skip as well
+    assert second.frame(-1).image == "image-rendered" and not second.frame(-1).changed
@@ -1,5 +1,12 @@
 from .utils import *
+from .frame import *
+from .resize_cache import *
+from .shm import *
 from .buffer import *
 from .inlay import *
 from .sbs import *
 from .merge import *
+from .tee import *
+from .perceptual_cache import *
+from .gate import *
+from .grid import *
@@ -1,13 +1,13 @@
-from threading import Thread
+from threading import Thread, Condition
 import multiprocessing
 multiprocessing.set_start_method("spawn", force=True)  # compatible with CUDA
 from multiprocessing import Process, Pipe, Value
 from typing import Any, List
+from utils import SharedFramePool, Frame, as_captures
 import ctypes
-import time
 
 
-def update_element(input_captures_conn, output_captures_conn, element, args, kwargs, terminate):
+def update_element(input_captures_conn, output_captures_conn, element, args, kwargs, input_pool=None, output_pool=None):
     """
     This method is only used when use_mp is True
     """
@@ -15,16 +15,27 @@ def update_element(input_captures_conn, output_captures_conn, element, args, kwa
         if type(element) == type:
             element = element(*args, **kwargs)
             element.start()
-        while not terminate.value:
+        while True:
+            # The Buffer thread sends None when it stops
             input_captures = input_captures_conn.recv()
-            output_captures = element(input_captures)
-            output_captures_conn.send(output_captures)
+            if input_captures is None:
+                break
+            if input_pool is not None:
+                # Only the descriptors are received, the pixels are views on the shared memory
+                input_captures = input_pool.decode(input_captures)
+                num_caps = len(input_captures)
+                output_captures = element(input_captures)
+                output_captures_conn.send(output_pool.encode(output_captures, start=num_caps))
+            else:
+                output_captures = element(input_captures)
+                output_captures_conn.send(output_captures)
     finally:
         print(f"Stopped Buffer process")
 
 
 class Buffer:
-    def __init__(self, element, *args, default_idx=[-1], use_mp=True, **kwargs):
+    def __init__(self, element, *args, default_idx=[-1], use_mp=True, transport="pickle", shm_slots=8,
+                 shm_slot_size=1024 * 1024 * 8, **kwargs):
         """
         This class wraps an element and creates a non-blocking __call__() method. The element is either executed using
             threading if use_mp is False and with multiprocessing is otherwise.
@@ -34,26 +45,45 @@ class Buffer:
             instance cannot be transferred to another process by pickling in the case of spawning a new process.
         :param args: Arguments for the element-instance construction.
         :param default_idx: A list of input indices to use when the wrapped element has no captures ready.
-            or a strings to put strings constants in the captures.
+            or a strings to put strings constants in the captures, or None to put an empty entry in the captures.
+            Use one entry per entry that the element appends, so the indices behind the Buffer do not depend on
+            whether a result is ready. An index is relative to the captures including the entries that are already
+            appended, e.g. [None, -2] for a processor with input_idx=-1 and output_detections=True.
         :param use_mp: Use multiprocessing is this is True
+        :param transport: How captures are sent to and from the process when use_mp is True. Either "pickle" to send
+            the captures through a pipe or "shm" to put the arrays in a pool of shared memory slots and only send
+            small descriptors through the pipe.
+        :param shm_slots: The number of shared memory slots per direction (transport="shm" only).
+        :param shm_slot_size: The size of a shared memory slot in bytes. Larger arrays are pickled (transport="shm" only).
         :param kwargs: Keyword arguments for the element-instance construction.
         """
         self.terminate = Value(ctypes.c_bool)
         self.terminate.value = False
         self.input_captures_conn, input_captures_child = Pipe()
         self.output_captures_conn, output_captures_child = Pipe()
+        self.input_pool = None
+        self.output_pool = None
+        if transport not in ("pickle", "shm"):
+            raise ValueError(f"Invalid transport: {transport}")
         if use_mp:
             # Create a process that creates the element
             self.element = None
-            self.process = Process(target=update_element, args=(input_captures_child, output_captures_child, element, args, kwargs, self.terminate))
+            if transport == "shm":
+                self.input_pool = SharedFramePool(shm_slots, shm_slot_size)
+                self.output_pool = SharedFramePool(shm_slots, shm_slot_size)
+            self.process = Process(target=update_element, args=(input_captures_child, output_captures_child, element, args, kwargs, self.input_pool, self.output_pool))
         else:
             # Create the element or assign it
             self.element = element(*args, **kwargs) if type(element) == type else element
             self.process = None
         self.thread = Thread(target=self.update, args=())
         self.thread.daemon = True
+        self.condition = Condition()
+        self.version = 0
         self.updated = False
-        self.default_idx = default_idx
+        self.default_idx = default_idx if isinstance(default_idx, (list, tuple)) else [default_idx]
+        # The input frames and the placeholders that were returned for them before the first result
+        self.placeholders = (None, None)
         self.input_captures = None
         self.output_captures = None
         self.next = None
@@ -62,53 +92,114 @@ class Buffer:
     def __call__(self, captures: List[Any]) -> List[Any]:
         if self.prev:
             captures = self.prev([])
+        captures = as_captures(captures)
 
         num_caps = len(captures)
-        if self.input_captures is None:
-            # start processing the next image
-            self.input_captures = captures.copy()
+        with self.condition:
+            if self.input_captures is None:
+                # start processing the next image
+                self.input_captures = captures.copy()
+                self.condition.notify_all()
 
-        if len(captures) == 0:
-            # If there is no output and no captures we have to block
-            while self.output_captures is None:
-                time.sleep(0)
+            if len(captures) == 0:
+                # If there is no output and no captures we have to block
+                self.condition.wait_for(lambda: self.output_captures is not None or self.terminate.value)
+            result_captures = self.output_captures
 
-        if self.output_captures is None:
-            # If there is no output return the input instead
+        if result_captures is None and self.terminate.value:
+            # Stopped before the element produced a result, the captures can be empty so there is nothing to
+            # derive the defaults from
+            return captures
+
+        if result_captures is None:
+            # If there is no output return the input instead (marked as stale)
             output_captures = captures.copy()
+            placeholder_inputs, placeholders = self.placeholders
+            if placeholders is not None and len(placeholder_inputs) == num_caps and \
+                    all(a is b for a, b in zip(placeholder_inputs, captures.frames)):
+                # The same input again, return the same placeholders so viewers do not see a new frame
+                output_captures.extend(placeholders)
+                return output_captures
             for idx in self.default_idx:
-                if isinstance(idx, str):
-                    output_captures.append(idx)
+                if idx is None:
+                    output_captures.append(Frame(None, stale=True))
+                elif isinstance(idx, str):
+                    output_captures.append(Frame(idx, stale=True))
                 else:
-                    output_captures.append(output_captures[idx].copy())
-
+                    output_captures.derive(idx, output_captures[idx].copy(), stale=True)
+            self.placeholders = (list(captures.frames), output_captures[num_caps:])
             return output_captures
         else:
             # Intended output
             # return the new result (keep te original content of captures)
             output_captures = captures.copy()
-            for i in range(num_caps, len(self.output_captures)):
-                output_captures.append(self.output_captures[i])
+            for i in range(num_caps, len(result_captures)):
+                output_captures.append(result_captures.frame(i))
             self.updated = True
             return output_captures
 
+    def get(self, timeout=None):
+        """
+        Block until the wrapped element produced a result.
+
+        :param timeout: The maximum time to wait in seconds or None to wait forever.
+        :return: The latest output captures or None if there is no result within timeout.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.output_captures is not None or self.terminate.value, timeout)
+            return self.output_captures
+
+    def wait_for_update(self, version=0, timeout=None) -> int:
+        """
+        Block until a result newer than version is available.
+
+        :param version: The last version seen by the caller.
+        :param timeout: The maximum time to wait in seconds or None to wait forever.
+        :return: The current version, which equals version if there was no new result within timeout.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version > version or self.terminate.value, timeout)
+            return self.version
+
     def update(self):
         try:
-            while not self.terminate.value:
-                if self.input_captures is not None:
-                    if self.process is not None:
-                        # Use MP
-                        self.input_captures_conn.send(self.input_captures)
-                        output_captures = self.output_captures_conn.recv()
-                    else:
-                        # Only Threading
-                        output_captures = self.element(self.input_captures)
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.input_captures is not None or self.terminate.value)
+                    if self.terminate.value:
+                        break
+                    input_captures = self.input_captures
+
+                if self.input_pool is not None:
+                    # Use MP with shared memory, copy the results out before the slots are reused
+                    self.input_captures_conn.send(self.input_pool.encode(input_captures))
+                    output_captures = self.output_pool.decode(self.output_captures_conn.recv(), copy=True)
+                elif self.process is not None:
+                    # Use MP
+                    self.input_captures_conn.send(input_captures)
+                    output_captures = self.output_captures_conn.recv()
+                else:
+                    # Only Threading
+                    output_captures = self.element(input_captures)
+
+                output_captures = as_captures(output_captures)
+                if self.version == 0 and len(output_captures) - len(input_captures) != len(self.default_idx):
+                    print(f"Warning: the element of {self.__class__} {id(self)} appends "
+                          f"{len(output_captures) - len(input_captures)} entries but default_idx has "
+                          f"{len(self.default_idx)}")
+                with self.condition:
                     self.output_captures = output_captures
                     self.input_captures = None
-                time.sleep(0)
+                    self.version += 1
+                    self.condition.notify_all()
             if self.process is not None:
+                # Stop the process
+                self.input_captures_conn.send(None)
                 self.process.join()
         finally:
+            if self.input_pool is not None:
+                self.input_pool.close()
+                self.output_pool.close()
             print(f"Stopped thread {self.__class__} {id(self)}")
 
     def start(self, block: bool = False):
@@ -127,7 +218,9 @@ class Buffer:
 
     def stop(self):
         print(f"Stopping {self.__class__} {id(self)}")
-        self.terminate = True
+        with self.condition:
+            self.terminate.value = True
+            self.condition.notify_all()
         if self.element:
             self.element.stop()
 
@@ -0,0 +1,135 @@
+from typing import Any, Iterable, List, Union
+import time
+
+
+class Frame:
+    __slots__ = ("image", "timestamp", "seq", "source", "stale", "changed", "__weakref__")
+
+    def __init__(self, image: Any, timestamp: float = None, seq: int = None, source: Any = None, stale: bool = False,
+                 changed: bool = True):
+        """
+        Envelope around a single entry of the captures (an image, a string or None).
+
+        :param image: The content of the entry.
+        :param timestamp: The time.time() at which the source frame was captured.
+        :param seq: The sequence number of the source frame.
+        :param source: The id of the capture device or stream that produced the source frame.
+        :param stale: True if this entry is a placeholder for a result that is not ready yet (see Buffer.default_idx).
+        :param changed: False if a ChangeGate found no change in the scene since the last changed frame, processors
+            then reuse their last output.
+        """
+        self.image = image
+        self.timestamp = timestamp
+        self.seq = seq
+        self.source = source
+        self.stale = stale
+        self.changed = changed
+
+    def derive(self, image: Any, stale: bool = False) -> 'Frame':
+        """
+        Create a new frame with the same provenance (timestamp, seq, source and changed) but different content.
+        """
+        return Frame(image, self.timestamp, self.seq, self.source, stale, self.changed)
+
+    def unchanged(self) -> 'Frame':
+        """
+        Create a copy of this frame that is marked as unchanged (see ChangeGate).
+        """
+        return Frame(self.image, self.timestamp, self.seq, self.source, self.stale, False)
+
+    def age(self) -> Union[float, None]:
+        """
+        :return: The number of seconds since the source frame was captured or None if it is unknown.
+        """
+        if self.timestamp is None:
+            return None
+        return time.time() - self.timestamp
+
+    def __repr__(self):
+        return f"Frame(seq={self.seq}, source={self.source}, timestamp={self.timestamp}, stale={self.stale}, " \
+               f"changed={self.changed})"
+
+
+class Captures:
+    __slots__ = ("frames",)
+
+    def __init__(self, items: Iterable = ()):
+        """
+        The list that is passed between elements. Indexing, iteration, append(), extend() and copy() behave like
+            the plain list that was used before, so captures[-1] returns the image itself. The Frame envelope of an
+            entry, with its timestamp, sequence number, source and stale flag, is available through frame().
+
+        :param items: Frames, or plain entries that are wrapped in a Frame without provenance.
+        """
+        if isinstance(items, Captures):
+            self.frames = list(items.frames)
+        else:
+            self.frames = [item if isinstance(item, Frame) else Frame(item) for item in items]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return Captures(self.frames[idx])
+        return self.frames[idx].image
+
+    def __setitem__(self, idx, item):
+        self.frames[idx] = item if isinstance(item, Frame) else Frame(item)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return (frame.image for frame in self.frames)
+
+    def __repr__(self):
+        return f"Captures({self.frames})"
+
+    def frame(self, idx: int) -> Frame:
+        return self.frames[idx]
+
+    def append(self, item: Any):
+        self.frames.append(item if isinstance(item, Frame) else Frame(item))
+
+    def extend(self, items: Iterable):
+        if isinstance(items, Captures):
+            self.frames.extend(items.frames)
+        else:
+            for item in items:
+                self.append(item)
+
+    def derive(self, idx: int, image: Any, stale: bool = False):
+        """
+        Append image with the provenance of the entry at idx.
+        """
+        self.frames.append(self.frames[idx].derive(image, stale))
+
+    def copy(self) -> 'Captures':
+        return Captures(self)
+
+    def reuse_outputs(self, frame: Frame, outputs: Union[List[Frame], None]) -> bool:
+        """
+        Append the outputs of an element for an earlier frame if the ChangeGate found no change since then.
+
+        :param frame: The input frame of the element.
+        :param outputs: The outputs of the last processed frame (see outputs_since) or None.
+        :return: True if the outputs were appended and the element can skip processing.
+        """
+        if frame.changed or outputs is None:
+            return False
+        self.frames.extend(outputs)
+        return True
+
+    def outputs_since(self, start: int) -> List[Frame]:
+        """
+        :return: The entries from start on, marked as unchanged so the elements behind the element that appended them
+            skip as well when they are reused with reuse_outputs.
+        """
+        return [frame.unchanged() for frame in self.frames[start:]]
+
+
+def as_captures(captures: Union[Captures, List[Any]]) -> Captures:
+    """
+    Return captures as a Captures instance. Plain lists, as passed to the first element of a pipeline, are wrapped.
+    """
+    if isinstance(captures, Captures):
+        return captures
+    return Captures(captures)
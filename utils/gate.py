@@ -0,0 +1,96 @@
+from typing import List, Any
+from utils import as_captures
+import time
+import cv2
+
+
+class ChangeGate:
+    def __init__(self, input_idx=-1, threshold=0.01, pixel_threshold=20, width=64, refresh_interval=None):
+        """
+        Marks the frame at input_idx as unchanged (Frame.changed is False) when the scene did not change since the
+            last changed frame, so processors behind the gate reuse their last output instead of running. The
+            change score is the fraction of pixels of a blurred width pixels wide grayscale thumbnail that differ
+            more than pixel_threshold from the thumbnail of the last changed frame.
+
+        :param threshold: Frames with a score below this fraction are unchanged.
+        :param pixel_threshold: The minimum difference (0-255) of a changed pixel, to ignore sensor noise.
+        :param width: The width of the thumbnail.
+        :param refresh_interval: Let a frame through as changed at least every refresh_interval seconds (None to
+            never force a refresh).
+        """
+        self.input_idx = input_idx
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.refresh_interval = refresh_interval
+
+        self.reference = None
+        self.reference_time = 0
+        self.score = 0.0
+        self.frames = 0
+        self.skipped = 0
+
+        self.input = None
+        self.output = None
+
+        self.prev = None
+        self.next = None
+
+    def thumbnail(self, image):
+        h, w = image.shape[:2]
+        thumbnail = cv2.resize(image, (self.width, max(h * self.width // w, 1)), interpolation=cv2.INTER_AREA)
+        if thumbnail.ndim == 3:
+            thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(thumbnail, (3, 3), 0)
+
+    def changed(self, image) -> bool:
+        thumbnail = self.thumbnail(image)
+        if self.reference is None or self.reference.shape != thumbnail.shape or \
+                (self.refresh_interval is not None and time.time() - self.reference_time >= self.refresh_interval):
+            self.score = 1.0
+        else:
+            self.score = float((cv2.absdiff(thumbnail, self.reference) > self.pixel_threshold).mean())
+        if self.score >= self.threshold:
+            self.reference = thumbnail
+            self.reference_time = time.time()
+            return True
+        return False
+
+    def stats(self):
+        """
+        :return: The number of gated frames, skipped (unchanged) frames, the skip rate, the last score and the
+            threshold.
+        """
+        return {"frames": self.frames, "skipped": self.skipped,
+                "skip_rate": self.skipped / self.frames if self.frames else 0.0,
+                "score": self.score, "threshold": self.threshold}
+
+    def __call__(self, captures: List[Any]) -> List[Any]:
+        if self.prev:
+            captures = self.prev([])
+        captures = as_captures(captures)
+
+        frame = captures.frame(self.input_idx)
+        if frame.image is None or frame.stale:
+            return captures
+
+        if frame is not self.input:
+            self.frames += 1
+            if self.changed(frame.image):
+                self.output = frame
+            else:
+                self.skipped += 1
+                self.output = frame.unchanged()
+            self.input = frame
+        # The same frame again gets the same decision (and Frame object)
+        captures[self.input_idx] = self.output
+        return captures
+
+    def start(self, block: bool = False):
+        return
+
+    def stop(self):
+        return
+
+    def wait(self, timeout=3):
+        return False
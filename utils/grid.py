@@ -0,0 +1,129 @@
+from typing import List, Any
+from utils import as_captures, resize_cache, CanvasBuffers
+import threading
+import weakref
+import math
+import cv2
+
+
+class Grid:
+    def __init__(self, elements, rows=None, cols=None, input_idx=-1, factor=1, tile_size=None, gap=2,
+                 inter=cv2.INTER_AREA):
+        """
+        Composes the frames at input_idx of any number of elements into a rows x cols grid, in row-major order, and
+            appends it to the captures. Replaces chains of Merge and SBS elements: every tile is resized straight
+            into its slice of a preallocated canvas, and only the tiles whose input frame changed are redrawn. A canvas
+            is only reused when nothing references an earlier output drawn in it anymore (see CanvasBuffers).
+
+        :param elements: The elements (or pipelines) that are pulled for the tiles, like Merge.
+        :param rows: The number of rows (None to derive it from cols, or make the grid as square as possible).
+        :param cols: The number of columns (None to derive it from rows).
+        :param factor: Scale the tiles down by this factor, relative to the first input frame.
+        :param tile_size: The (width, height) of a tile instead of the first input frame divided by factor.
+        :param gap: The number of (black) pixels between the tiles.
+        :param inter: The interpolation of the resize.
+        """
+        self.elements = list(elements)
+        if rows is None and cols is None:
+            cols = math.ceil(math.sqrt(len(self.elements)))
+        if rows is None:
+            rows = math.ceil(len(self.elements) / cols)
+        if cols is None:
+            cols = math.ceil(len(self.elements) / rows)
+        if rows * cols < len(self.elements):
+            raise ValueError(f"A {rows}x{cols} grid does not fit {len(self.elements)} elements")
+        self.rows = rows
+        self.cols = cols
+        self.input_idx = input_idx
+        self.factor = factor
+        self.tile_size = tile_size
+        self.gap = gap
+        self.inter = inter
+
+        self.canvases = CanvasBuffers()
+        # Weak references to the input frames drawn in each canvas by id of the canvas, strong references would keep
+        # the outputs of the inputs alive and stop them from reusing their canvases
+        self.drawn = {}
+        self.frames = None
+        self.output = None
+        self.lock = threading.Lock()
+
+        self.prev = None
+        self.next = None
+
+    def canvas_shape(self, image):
+        if self.tile_size is None:
+            h, w = image.shape[:2]
+            self.tile_size = (max(w // self.factor, 1), max(h // self.factor, 1))
+        w, h = self.tile_size
+        return self.rows * h + (self.rows - 1) * self.gap, self.cols * w + (self.cols - 1) * self.gap, 3
+
+    def tile(self, canvas, i):
+        """
+        :return: The slice of canvas of tile i.
+        """
+        w, h = self.tile_size
+        row, col = divmod(i, self.cols)
+        x, y = col * (w + self.gap), row * (h + self.gap)
+        return canvas[y:y + h, x:x + w]
+
+    def draw(self, canvas, i, frame):
+        tile = self.tile(canvas, i)
+        image = frame.image if frame is not None else None
+        if image is None:
+            tile[...] = 0
+            return
+        # Keep the aspect ratio, top left aligned like SBS
+        th, tw = tile.shape[:2]
+        h, w = image.shape[:2]
+        scale = min(tw / w, th / h)
+        w, h = max(int(w * scale), 1), max(int(h * scale), 1)
+        if (w, h) != (tw, th):
+            tile[...] = 0
+        resize_cache.resize_into(frame, tile[:h, :w], self.inter)
+
+    def __call__(self, captures: List[Any]) -> List[Any]:
+        if self.prev:
+            captures = self.prev([])
+        captures = as_captures(captures)
+
+        frames = []
+        for element in self.elements:
+            results = as_captures(element([]))
+            frames.append(results.frame(self.input_idx) if len(results) > 0 else None)
+        first = next((frame for frame in frames if frame is not None and frame.image is not None), None)
+        if first is None:
+            captures.append(None)
+            return captures
+
+        with self.lock:
+            if self.output is not None and all(a is b for a, b in zip(frames, self.frames)):
+                # Nothing changed since the last call
+                captures.append(self.output)
+                return captures
+
+            canvas, new = self.canvases.get(self.canvas_shape(first.image), first.image.dtype)
+            # Every canvas is a new view, the buffer behind it holds the tiles
+            buffer = canvas.base if canvas.base is not None else canvas
+            if new:
+                self.drawn[id(buffer)] = [None] * len(self.elements)
+            drawn = self.drawn[id(buffer)]
+            for i, frame in enumerate(frames):
+                # A reused canvas holds the tiles of an earlier call, redraw those that changed since then
+                if (drawn[i]() if drawn[i] is not None else None) is not frame:
+                    self.draw(canvas, i, frame)
+                    drawn[i] = weakref.ref(frame) if frame is not None else None
+            self.drawn = {id(buffer): self.drawn[id(buffer)] for buffer in self.canvases.buffers}
+            self.frames = frames
+            self.output = first.derive(canvas)
+            captures.append(self.output)
+        return captures
+
+    def start(self, block: bool = False):
+        return
+
+    def stop(self):
+        return
+
+    def wait(self, timeout=3):
+        return False
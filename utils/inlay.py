@@ -1,12 +1,27 @@
 from typing import List, Any
-from utils import maintain_aspect_ratio_resize
+from utils import maintain_aspect_ratio_resize, resize_cache, as_captures, CanvasBuffers
+import threading
+import numpy as np
 
 
 class Inlay:
-    def __init__(self, input_idx=-1, thumb_input_idx=-2, factor=4):
+    def __init__(self, input_idx=-1, thumb_input_idx=-2, factor=4, reuse_canvas=True):
+        """
+        Pastes the entry at thumb_input_idx, scaled to 1 / factor of the width, with a white border in the top left
+            corner of the entry at input_idx and appends the result to the captures.
+
+        :param reuse_canvas: Copy the entry into a preallocated canvas from a CanvasBuffers pool and resize the
+            thumbnail straight into it, instead of allocating a new canvas and thumbnail for every frame. A canvas is
+            only reused when the shape of the entry did not change and nothing references its earlier output anymore.
+        """
         self.input_idx = input_idx
         self.thumb_input_idx = thumb_input_idx
         self.factor = factor
+        self.reuse_canvas = reuse_canvas
+        self.canvases = CanvasBuffers()
+        self.lock = threading.Lock()
+        self.inputs = None
+        self.output = None
 
         self.prev = None
         self.next = None
@@ -14,22 +29,50 @@ class Inlay:
     def __call__(self, captures: List[Any]) -> List[Any]:
         if self.prev:
             captures = self.prev([])
+        captures = as_captures(captures)
+
+        inputs = (captures.frame(self.input_idx), captures.frame(self.thumb_input_idx))
+        with self.lock:
+            if self.inputs is not None and all(a is b for a, b in zip(inputs, self.inputs)):
+                # Nothing changed since the last call
+                captures.append(self.output)
+                return captures
+
+            image = captures[self.input_idx]
+            if image is None:
+                captures.append(None)
+                return captures
+
+            if self.reuse_canvas:
+                canvas = self.compose_into(image, captures.frame(self.thumb_input_idx))
+            else:
+                canvas = self.compose(image, captures[self.thumb_input_idx])
+            captures.derive(self.input_idx, canvas)
+            self.inputs = inputs
+            self.output = captures.frame(-1)
+        return captures
+
+    def compose(self, image, thumbnail):
+        canvas = image.copy()
+        if thumbnail is not None:
+            _, w, _ = canvas.shape
+            w = w // self.factor
+            thumbnail = maintain_aspect_ratio_resize(thumbnail, width=w)
+            h, w, _ = thumbnail.shape
+            canvas[0:h+2, 0:w+2, :] = 255
+            canvas[0:h, 0:w, :] = thumbnail
+        return canvas
 
-        canvas = captures[self.input_idx].copy()
-        if canvas is None:
-            captures.append(None)
-            return captures
-        else:
-            thumbnail = captures[self.thumb_input_idx]
-            if thumbnail is not None:
-                _, w, _ = canvas.shape
-                w = w // self.factor
-                thumbnail = maintain_aspect_ratio_resize(thumbnail, width=w)
-                h, w, _ = thumbnail.shape
-                canvas[0:h+2, 0:w+2, :] = 255
-                canvas[0:h, 0:w, :] = thumbnail
-            captures.append(canvas)
-            return captures
+    def compose_into(self, image, thumbnail):
+        canvas, _ = self.canvases.get(image.shape, image.dtype)
+        np.copyto(canvas, image)
+        if thumbnail.image is not None:
+            th, tw = thumbnail.image.shape[:2]
+            w = canvas.shape[1] // self.factor
+            h = int(th * w / float(tw))
+            canvas[0:h+2, 0:w+2, :] = 255
+            resize_cache.resize_into(thumbnail, canvas[0:h, 0:w])
+        return canvas
 
     def start(self, block: bool = False):
         return
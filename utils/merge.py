@@ -1,4 +1,5 @@
 from typing import List, Any
+from utils import Captures, as_captures
 
 
 class Merge:
@@ -13,14 +14,15 @@ class Merge:
     def __call__(self, captures: List[Any]) -> List[Any]:
         if self.prev:
             captures = self.prev([])
+        captures = as_captures(captures)
 
-        first = self.first_element([])
-        second = self.second_element([])
+        first = as_captures(self.first_element([]))
+        second = as_captures(self.second_element([]))
         if self.first_idx is not None:
-            first = [first[self.first_idx]]
+            first = Captures([first.frame(self.first_idx)])
 
         if self.second_idx is not None:
-            second = [second[self.second_idx]]
+            second = Captures([second.frame(self.second_idx)])
 
         captures.extend(first)
         captures.extend(second)
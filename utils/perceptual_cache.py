@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from typing import Any, Hashable
+import cv2
+
+
+def dhash(image, hash_size=8) -> int:
+    """
+    Difference hash of an image: the signs of the horizontal gradients of a hash_size x hash_size grayscale
+        thumbnail, as a hash_size * hash_size bit integer. Nearly identical frames have a small Hamming distance.
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PerceptualCache:
+    def __init__(self, max_size=64, max_distance=4, hash_size=8):
+        """
+        LRU cache keyed by the perceptual hash (dHash) of a frame and a second key such as a prompt. A lookup hits
+            the nearest entry with the same key within max_distance bits, so nearly identical scenes share a value.
+
+        :param max_size: The maximum number of entries, the least recently used entry is evicted first.
+        :param max_distance: The maximum Hamming distance in bits between the hashes of a hit (0 for exact matches).
+        :param hash_size: The hashes have hash_size * hash_size bits.
+        """
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image, key: Hashable = None):
+        """
+        :return: The cache key of image and key (for put), and the cached value or None on a miss.
+        """
+        cache_key = (key, dhash(image, self.hash_size))
+        best, best_distance = None, self.max_distance + 1
+        if cache_key in self.entries:
+            best, best_distance = cache_key, 0
+        else:
+            for entry_key in self.entries:
+                if entry_key[0] == key:
+                    distance = hamming(entry_key[1], cache_key[1])
+                    if distance < best_distance:
+                        best, best_distance = entry_key, distance
+        if best is None:
+            self.misses += 1
+            return cache_key, None
+        self.hits += 1
+        self.entries.move_to_end(best)
+        return cache_key, self.entries[best]
+
+    def put(self, cache_key, value: Any):
+        self.entries[cache_key] = value
+        self.entries.move_to_end(cache_key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        """
+        :return: The number of hits, misses, the hit rate and the number of entries.
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries)}
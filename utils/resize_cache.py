@@ -0,0 +1,141 @@
+from collections import OrderedDict
+from utils import resize_into
+import threading
+import weakref
+import numpy as np
+import cv2
+
+
+class ResizeCache:
+    def __init__(self, max_bytes=64 * 2 ** 20):
+        """
+        Memoizes resized images per Frame, so a frame that several elements (e.g. Inlay, SBS and Grid) resize to the
+            same size is resized once. Entries are keyed by the identity of the Frame, the size and the
+            interpolation, and are dropped when the Frame is garbage collected (a new frame arrived and the old one
+            is no longer referenced) or, least recently used first, when the cache grows beyond max_bytes.
+            resize_into only caches a resize that is requested a second time, a resize with a single consumer is
+            written straight into its destination without an intermediate image.
+
+        :param max_bytes: The memory budget of the cached images (0 disables the cache).
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        # The keys that resize_into resized once, by weak reference to their Frame
+        self.seen = {}
+        self.nbytes = 0
+        self.dead = []
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def collected(self, ref):
+        # Called by the garbage collector, possibly while the lock is held, so only note it
+        self.dead.append(ref)
+
+    def purge(self):
+        if not self.dead:
+            return
+        # Dead references can not be hashed, compare them by identity
+        dead, self.dead = self.dead, []
+        dead = {id(ref) for ref in dead}
+        for key in [key for key, (ref, _) in self.entries.items() if id(ref) in dead]:
+            self.remove(key)
+        for key in [key for key, ref in self.seen.items() if id(ref) in dead]:
+            del self.seen[key]
+
+    def remove(self, key):
+        _, image = self.entries.pop(key)
+        self.nbytes -= image.nbytes
+
+    def resize(self, frame, size, inter=cv2.INTER_AREA):
+        """
+        :param frame: The Frame of the image.
+        :param size: The (width, height) of the result.
+        :return: The image of frame resized to size, which is shared and must not be modified.
+        """
+        size = tuple(size)
+        image = frame.image
+        if image.shape[1::-1] == size:
+            return image
+        if self.max_bytes <= 0:
+            return cv2.resize(image, size, interpolation=inter)
+
+        key = (id(frame), size, inter)
+        with self.lock:
+            cached = self.lookup(key, frame)
+            if cached is not None:
+                return cached
+            self.misses += 1
+
+        resized = cv2.resize(image, size, interpolation=inter)
+        self.store(key, frame, resized)
+        return resized
+
+    def lookup(self, key, frame):
+        """
+        :return: The cached image of key or None (call with the lock held).
+        """
+        self.purge()
+        entry = self.entries.get(key)
+        # The id of a collected frame can be reused before its entries are purged
+        if entry is None or entry[0]() is not frame:
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def store(self, key, frame, resized):
+        resized.flags.writeable = False
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            if resized.nbytes <= self.max_bytes:
+                self.entries[key] = (weakref.ref(frame, self.collected), resized)
+                self.nbytes += resized.nbytes
+                while self.nbytes > self.max_bytes:
+                    self.remove(next(iter(self.entries)))
+
+    def resize_into(self, frame, dst, inter=cv2.INTER_AREA):
+        """
+        Write the image of frame resized to the size of dst into dst, e.g. a slice of a canvas.
+        """
+        if self.max_bytes <= 0 or frame.image.shape[:2] == dst.shape[:2]:
+            return resize_into(frame.image, dst, inter)
+
+        # The shape of dst includes the channels, a gray frame is converted when dst has color
+        key = (id(frame), dst.shape, inter)
+        with self.lock:
+            cached = self.lookup(key, frame)
+            if cached is None:
+                self.misses += 1
+                ref = self.seen.pop(key, None)
+                shared = ref is not None and ref() is frame
+                if not shared:
+                    self.seen[key] = weakref.ref(frame, self.collected)
+        if cached is not None:
+            np.copyto(dst, cached)
+            return dst
+
+        resize_into(frame.image, dst, inter)
+        if shared:
+            # A second consumer asked for the same resize, keep a copy for the next ones
+            self.store(key, frame, dst.copy())
+        return dst
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.seen.clear()
+            self.nbytes = 0
+            self.dead.clear()
+
+    def stats(self):
+        """
+        :return: The number of hits and misses, the hit rate, the number of cached images and their size in bytes.
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries), "bytes": self.nbytes}
+
+
+resize_cache = ResizeCache()
@@ -1,20 +1,35 @@
 from typing import List, Any
-from utils import maintain_aspect_ratio_resize
+from utils import maintain_aspect_ratio_resize, resize_cache, as_captures, CanvasBuffers
+import threading
 import numpy as np
 
 
 class SBS:
-    def __init__(self, first_idx, second_idx, factor=2, flip=False):
+    def __init__(self, first_idx, second_idx, factor=2, flip=False, reuse_canvas=True):
+        """
+        Puts the entries at first_idx and second_idx side by side (or on top of each other when flip is set), scaled
+            down by factor, and appends the result to the captures.
+
+        :param reuse_canvas: Resize the entries straight into a preallocated canvas from a CanvasBuffers pool,
+            instead of allocating a new canvas for every frame. A canvas is only reused when the shapes of the entries
+            did not change and nothing references its earlier output anymore.
+        """
         self.first_index = first_idx
         self.second_index = second_idx
         self.factor = factor
         self.flip = flip
+        self.reuse_canvas = reuse_canvas
+        self.canvases = CanvasBuffers()
+        self.lock = threading.Lock()
+        self.inputs = None
+        self.output = None
         self.prev = None
         self.next = None
 
     def __call__(self, captures: List[Any]) -> List[Any]:
         if self.prev:
             captures = self.prev([])
+        captures = as_captures(captures)
 
         first = captures[self.first_index]
         second = captures[self.second_index]
@@ -24,33 +39,63 @@ class SBS:
             return captures
 
         if first is None:
-            captures.append(second)
+            captures.append(captures.frame(self.second_index))
             return captures
 
         if second is None:
-            captures.append(first)
+            captures.append(captures.frame(self.first_index))
             return captures
 
+        inputs = (captures.frame(self.first_index), captures.frame(self.second_index))
+        with self.lock:
+            if self.inputs is not None and all(a is b for a, b in zip(inputs, self.inputs)):
+                # Nothing changed since the last call
+                captures.append(self.output)
+                return captures
+
+            if self.reuse_canvas:
+                canvas = self.compose_into(*inputs)
+            else:
+                canvas = self.compose(first, second)
+
+            captures.derive(self.first_index, canvas)
+            self.inputs = inputs
+            self.output = captures.frame(-1)
+        return captures
+
+    def scaled_size(self, image):
+        h, w = image.shape[:2]
+        width = w // self.factor
+        return width, int(h * width / float(w))
+
+    def layout(self, first_size, second_size):
+        """
+        :return: The shape of the canvas and the top left corner of the second entry.
+        """
+        (w1, h1), (w2, h2) = first_size, second_size
+        if not self.flip:
+            return (max(h1, h2), w1 + w2 + 2, 3), (w1 + 2, 0)
+        return (h1 + h2 + 2, max(w1, w2), 3), (0, h1 + 2)
+
+    def compose(self, first, second):
         first = maintain_aspect_ratio_resize(first, width=first.shape[1] // self.factor)
         second = maintain_aspect_ratio_resize(second, width=second.shape[1] // self.factor)
-        h1, w1, _ = first.shape
-        h2, w2, _ = second.shape
+        h1, w1 = first.shape[:2]
+        h2, w2 = second.shape[:2]
+        shape, (x, y) = self.layout((w1, h1), (w2, h2))
+        canvas = np.zeros(shape, dtype=first.dtype)
+        canvas[0:h1, 0:w1, :] = first
+        canvas[y:y + h2, x:x + w2, :] = second
+        return canvas
 
-        if not self.flip:
-            h = max(h1, h2)
-            w = w1 + w2 + 2
-            canvas = np.zeros([h, w, 3], dtype=first.dtype)
-            canvas[0:h1, 0:w1, :] = first
-            canvas[0:h2, w2+2:, :] = second
-        else:
-            h = h1 + h2 + 2
-            w = max(w1, w2)
-            canvas = np.zeros([h, w, 3], dtype=first.dtype)
-            canvas[0:h1, 0:w1, :] = first
-            canvas[h2+2:, 0:w2:, :] = second
-
-        captures.append(canvas)
-        return captures
+    def compose_into(self, first, second):
+        (w1, h1), (w2, h2) = self.scaled_size(first.image), self.scaled_size(second.image)
+        shape, (x, y) = self.layout((w1, h1), (w2, h2))
+        # The same shapes give the same layout, so the uncovered part of a reused canvas is still black
+        canvas, _ = self.canvases.get(shape, first.image.dtype)
+        resize_cache.resize_into(first, canvas[0:h1, 0:w1])
+        resize_cache.resize_into(second, canvas[y:y + h2, x:x + w2])
+        return canvas
 
     def start(self, block: bool = False):
         return
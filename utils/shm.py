@@ -0,0 +1,94 @@
+from multiprocessing import shared_memory
+from typing import Any, List, NamedTuple, Tuple, Union
+from utils import Frame, Captures
+import numpy as np
+
+
+class SharedFrame(NamedTuple):
+    """
+    Small descriptor that is sent over a pipe instead of the pixels of a frame.
+    """
+    slot: int
+    shape: Tuple[int, ...]
+    dtype: str
+    seq: int
+
+
+class SharedFramePool:
+    def __init__(self, num_slots=8, slot_size=1024 * 1024 * 8):
+        """
+        A pool of multiprocessing.shared_memory slots used to transfer frames between processes without pickling
+            the pixels. The pool is created in the parent process and attached in a child process by pickling it.
+
+        The slots are handed out in order for every call to encode() and are reused by the next call, so the pool
+            is only suitable for a strict request/response protocol where the receiver is done with the previous
+            message before the next one is encoded.
+
+        :param num_slots: The number of arrays that can be stored per message. Arrays that do not fit in the pool
+            are sent as is (pickled).
+        :param slot_size: The size of a single slot in bytes.
+        """
+        self.num_slots = num_slots
+        self.slot_size = slot_size
+        self.slots = [shared_memory.SharedMemory(create=True, size=slot_size) for _ in range(num_slots)]
+        self.owner = True
+        self.seq = 0
+        self.bytes_copied = 0
+
+    def __getstate__(self):
+        return {"names": [slot.name for slot in self.slots], "slot_size": self.slot_size}
+
+    def __setstate__(self, state):
+        self.num_slots = len(state["names"])
+        self.slot_size = state["slot_size"]
+        self.slots = [shared_memory.SharedMemory(name=name) for name in state["names"]]
+        self.owner = False
+        self.seq = 0
+        self.bytes_copied = 0
+
+    def encode(self, items: Union[Captures, List[Any]], start=0) -> Union[Captures, List[Any]]:
+        """
+        Copy the arrays in items to the pool and replace them with SharedFrame descriptors.
+
+        :param items: The captures to encode.
+        :param start: Items before this index are replaced by None because the receiver already has them.
+        """
+        self.seq += 1
+        slot = 0
+        encoded = [None] * min(start, len(items))
+        for item in (items.frames[start:] if isinstance(items, Captures) else items[start:]):
+            image = item.image if isinstance(item, Frame) else item
+            if isinstance(image, np.ndarray) and not image.dtype.hasobject and \
+                    image.nbytes <= self.slot_size and slot < self.num_slots:
+                np.ndarray(image.shape, dtype=image.dtype, buffer=self.slots[slot].buf)[...] = image
+                self.bytes_copied += image.nbytes
+                image = SharedFrame(slot, image.shape, image.dtype.str, self.seq)
+                slot += 1
+            encoded.append(item.derive(image, item.stale) if isinstance(item, Frame) else image)
+        return Captures(encoded) if isinstance(items, Captures) else encoded
+
+    def decode(self, items: Union[Captures, List[Any]], copy=False) -> Union[Captures, List[Any]]:
+        """
+        Replace the SharedFrame descriptors in items with arrays.
+
+        :param items: The encoded captures.
+        :param copy: Return copies instead of views on the pool. Views are only valid until the next message.
+        """
+        decoded = []
+        for item in (items.frames if isinstance(items, Captures) else items):
+            image = item.image if isinstance(item, Frame) else item
+            if isinstance(image, SharedFrame):
+                self.seq = image.seq
+                image = np.ndarray(image.shape, dtype=np.dtype(image.dtype), buffer=self.slots[image.slot].buf)
+                if copy:
+                    image = image.copy()
+                    self.bytes_copied += image.nbytes
+            decoded.append(item.derive(image, item.stale) if isinstance(item, Frame) else image)
+        return Captures(decoded) if isinstance(items, Captures) else decoded
+
+    def close(self):
+        for slot in self.slots:
+            slot.close()
+            if self.owner:
+                slot.unlink()
+        self.slots = []
@@ -0,0 +1,104 @@
+from threading import Lock
+from typing import List, Any
+from utils import as_captures
+
+
+class TeeSubscriber:
+    def __init__(self, tee: 'Tee', name: str):
+        """
+        A reader of a Tee. Use it as the first element of a pipeline instead of the element wrapped by the Tee.
+        """
+        self.tee = tee
+        self.name = name
+        self.seq = 0
+        self.received = 0
+        self.dropped = 0
+
+        self.prev = None
+        self.next = None
+
+    def __call__(self, captures: List[Any]) -> List[Any]:
+        captures = as_captures(captures)
+        captures.extend(self.tee.read(self))
+        return captures
+
+    def start(self, block: bool = False):
+        self.tee.start(block)
+
+    def stop(self):
+        self.tee.stop()
+
+    def wait(self, timeout=3):
+        return self.tee.wait(timeout)
+
+
+class Tee:
+    def __init__(self, element):
+        """
+        This class fans out the captures of a single element to many pipelines. Each published capture gets a
+            sequence number and is pulled from the element exactly once: a new capture is only pulled when the
+            reading subscriber has already seen the latest one, and only published when its frames differ (by
+            identity) from the latest published capture. Subscribers receive a shallow copy of the published
+            list, the images themselves are shared and must not be modified in place.
+
+        :param element: The element to pull captures from (e.g. a Buffer around an OpenCVCapture).
+        """
+        self.element = element
+        self.lock = Lock()
+        self.seq = 0
+        self.captures = None
+        self.subscribers = []
+        self.started = False
+        self.stopped = False
+
+    def subscribe(self, name=None) -> TeeSubscriber:
+        subscriber = TeeSubscriber(self, name if name is not None else f"subscriber{len(self.subscribers)}")
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def read(self, subscriber: TeeSubscriber) -> List[Any]:
+        with self.lock:
+            if subscriber.seq >= self.seq:
+                # The subscriber has seen the latest capture, pull the next one
+                captures = as_captures(self.element([]))
+                if self.captures is None or not self.same(captures, self.captures):
+                    # Only a new frame is published, a Buffer or threaded capture returns the same one until then
+                    self.captures = captures
+                    self.seq += 1
+            if subscriber.seq < self.seq:
+                if subscriber.received > 0:
+                    subscriber.dropped += self.seq - subscriber.seq - 1
+                subscriber.seq = self.seq
+                subscriber.received += 1
+            return self.captures.copy()
+
+    @staticmethod
+    def same(a, b) -> bool:
+        """
+        :return: True if the captures a and b hold the same frames (by identity).
+        """
+        return len(a) == len(b) and all(x is y for x, y in zip(a.frames, b.frames))
+
+    def stats(self):
+        """
+        :return: Per subscriber the last seen sequence number, the lag in captures behind the latest published
+            capture, the number of received and the number of skipped (dropped) captures.
+        """
+        with self.lock:
+            return {s.name: {"seq": s.seq, "lag": self.seq - s.seq, "received": s.received, "dropped": s.dropped}
+                    for s in self.subscribers}
+
+    def start(self, block: bool = False):
+        if not self.started:
+            self.started = True
+            self.element.start(block=False)
+        if block:
+            self.wait()
+
+    def stop(self):
+        if not self.stopped:
+            self.stopped = True
+            self.element.stop()
+
+    def wait(self, timeout=None):
+        return self.element.wait(timeout=timeout)
@@ -1,4 +1,6 @@
 import cv2
+import numpy as np
+import weakref
 
 
 def maintain_aspect_ratio_resize(image, width=None, height=None, inter=cv2.INTER_AREA):
@@ -15,6 +17,126 @@ def maintain_aspect_ratio_resize(image, width=None, height=None, inter=cv2.INTER
 
     return cv2.resize(image, dim, interpolation=inter)
 
+
+def resize_into(image, dst, inter=cv2.INTER_AREA):
+    """
+    Resize image to the size of dst and write it into dst, which can be a slice of a larger canvas, without
+        allocating an intermediate image.
+    """
+    h, w = dst.shape[:2]
+    if image.ndim == 2 and dst.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[:2] == (h, w):
+        np.copyto(dst, image)
+        return dst
+    out = cv2.resize(image, (w, h), dst=dst, interpolation=inter)
+    if out is not dst:
+        # Some OpenCV versions reallocate instead of writing into a non-contiguous destination
+        np.copyto(dst, out)
+    return dst
+
+
+class CanvasBuffers:
+    def __init__(self, count=3):
+        """
+        A pool of preallocated output images that elements draw into instead of allocating a new image for every
+            frame. get() hands out a canvas (a view on a pooled buffer) and the buffer returns to the pool when the
+            canvas is passed to release() or when the canvas is garbage collected, i.e. when no Frame, viewer, Buffer
+            or Grid holds the output anymore. So an output is never overwritten while someone can still read it. A
+            slice of a canvas does not hold on to the canvas, keep the canvas (or a copy of the slice) instead. A new
+            image is allocated when all buffers are in use.
+
+        :param count: The maximum number of buffers in the pool.
+        """
+        self.count = count
+        self.buffers = []
+        self.free = []
+        self.finalizers = {}
+        self.released = []
+
+    def get(self, shape, dtype=np.uint8):
+        """
+        :return: A canvas of shape and dtype and whether it is newly allocated (all zeros). The base of the canvas is
+            the pooled buffer. A reused buffer still holds what was drawn into it before, the pool is emptied when
+            shape or dtype changes.
+        """
+        shape = tuple(shape)
+        if self.buffers and (self.buffers[0].shape != shape or self.buffers[0].dtype != dtype):
+            self.buffers = []
+            self.free = []
+        while self.released:
+            buffer = self.released.pop()
+            if any(buffer is pooled for pooled in self.buffers):
+                self.free.append(buffer)
+        if self.free:
+            buffer, new = self.free.pop(), False
+        else:
+            buffer, new = np.zeros(shape, dtype=dtype), True
+            if len(self.buffers) >= self.count:
+                return buffer, new
+            self.buffers.append(buffer)
+        canvas = buffer[...]
+        self.finalizers[id(canvas)] = weakref.finalize(canvas, self.collected, id(canvas), buffer)
+        return canvas, new
+
+    def collected(self, key, buffer):
+        # Called by the garbage collector or release(), possibly while get() runs, so only note it
+        self.finalizers.pop(key, None)
+        self.released.append(buffer)
+
+    def release(self, canvas):
+        """
+        Return the buffer of canvas to the pool, the caller promises nothing reads the canvas anymore.
+        """
+        finalizer = self.finalizers.get(id(canvas))
+        if finalizer is not None:
+            finalizer()
+
+
+def letterbox(image, size, pad=True, color=(0, 0, 0), inter=cv2.INTER_AREA):
+    """
+    Scale an image down to fit in size while keeping the aspect ratio, and pad it to exactly that size.
+
+    :param size: (width, height) or the longest side (a square when padded).
+    :param pad: Pad to size (centered) or only scale.
+    :return: The image and the transform (scale, left, top) for remap_boxes and remap_mask.
+    """
+    h, w = image.shape[:2]
+    width, height = (size, size) if isinstance(size, int) else size
+    scale = min(width / w, height / h, 1.0)
+    if scale < 1.0:
+        image = cv2.resize(image, (max(int(round(w * scale)), 1), max(int(round(h * scale)), 1)),
+                           interpolation=inter)
+    if not pad:
+        return image, (scale, 0, 0)
+    h, w = image.shape[:2]
+    left, top = (width - w) // 2, (height - h) // 2
+    image = cv2.copyMakeBorder(image, top, height - h - top, left, width - w - left, cv2.BORDER_CONSTANT,
+                               value=color)
+    return image, (scale, left, top)
+
+
+def remap_boxes(boxes, transform):
+    """
+    Map (N, 4+) boxes of x1, y1, x2, y2 (extra columns such as scores are kept) from a letterboxed image back to
+        the original image.
+    """
+    scale, left, top = transform
+    boxes = boxes.copy()
+    boxes[:, 0:4:2] = (boxes[:, 0:4:2] - left) / scale
+    boxes[:, 1:4:2] = (boxes[:, 1:4:2] - top) / scale
+    return boxes
+
+
+def remap_mask(mask, transform, shape):
+    """
+    Map a binary mask from a letterboxed image back to an original image of shape.
+    """
+    scale, left, top = transform
+    h, w = shape[:2]
+    crop = mask[top:top + max(int(round(h * scale)), 1), left:left + max(int(round(w * scale)), 1)]
+    return cv2.resize(crop.astype("uint8"), (w, h), interpolation=cv2.INTER_NEAREST).astype(bool)
+
 ALIGNMENT_LEFT = 0
 ALIGNMENT_CENTER = 1
 ALIGNMENT_RIGHT = 2
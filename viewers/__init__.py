@@ -1,2 +1,3 @@
 from .opencv import *
 from .flask import *
+from .asyncstream import *
@@ -0,0 +1,275 @@
+from typing import Any, List
+from threading import Thread, Lock, Event
+from urllib.parse import urlsplit, parse_qs
+import asyncio
+import time
+
+
+class StreamPump:
+    def __init__(self, server: 'AsyncStreamServer', viewer, width=None, quality=None):
+        """
+        Fetches the frames of one variant of a stream on a single thread and hands them to all clients of that
+            variant on the event loop.
+        """
+        self.server = server
+        self.viewer = viewer
+        self.width = width
+        self.quality = quality
+        self.lock = Lock()
+        self.clients = 0
+        self.running = False
+        self.tick = 0
+        self.jpg = None
+        self.changed = asyncio.Event()
+
+    def subscribe(self):
+        with self.lock:
+            self.clients += 1
+            if not self.running:
+                self.running = True
+                thread = Thread(target=self.update, args=())
+                thread.daemon = True
+                thread.start()
+
+    def unsubscribe(self):
+        with self.lock:
+            self.clients -= 1
+
+    def update(self):
+        version = 0
+        while True:
+            with self.lock:
+                if self.clients == 0 or self.server.terminate:
+                    self.running = False
+                    return
+            version, jpg = self.fetch(version)
+            if jpg is not None:
+                try:
+                    self.server.loop.call_soon_threadsafe(self.publish, jpg)
+                except RuntimeError:
+                    # The event loop is closed
+                    return
+
+    def fetch(self, version):
+        return self.viewer.broadcaster.get(version, timeout=self.viewer.keepalive, width=self.width,
+                                           quality=self.quality)
+
+    def publish(self, jpg):
+        self.jpg = jpg
+        self.tick += 1
+        self.wake()
+
+    def wake(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def next(self, tick=0):
+        """
+        Wait for a frame (or a keepalive resend) after tick.
+
+        :return: The new tick and the jpg bytes (None if the server is stopping).
+        """
+        while self.tick <= tick:
+            if self.server.terminate:
+                return tick, None
+            await self.changed.wait()
+        return self.tick, self.jpg
+
+
+class MetadataPump(StreamPump):
+    def __init__(self, server: 'AsyncStreamServer', viewer):
+        """
+        Fetches the serialized records of a MetadataViewer on a single thread and hands them to all its clients on
+            the event loop.
+        """
+        super().__init__(server, viewer)
+
+    def fetch(self, version):
+        return self.viewer.get(version, timeout=self.viewer.keepalive)
+
+
+class AsyncStreamServer:
+
+    def __init__(self, name="stream_server", port=5000, host="0.0.0.0"):
+        """
+        Drop-in replacement for FlaskServer that serves the MJPEG streams of FlaskViewers and the metadata streams of
+            MetadataViewers from a single asyncio event loop instead of a thread per client. Clients of the same stream variant (see FlaskViewer.scales and
+            FlaskViewer.qualities) share one thread that fetches the frames, and the server can be stopped.
+        """
+        self.name = name
+        self.host = host
+        self.port = port
+        self.streams = {}
+        self.metadata_streams = {}
+        self.pumps = {}
+        self.tasks = set()
+        self.clients = 0
+        self.terminate = False
+        self.loop = None
+        self.stopping = None
+        self.started = Event()
+
+        self.thread = Thread(target=self.run, args=())
+        self.thread.daemon = True
+
+    def __call__(self, captures: List[Any]) -> List[Any]:
+        return captures
+
+    def add_stream(self, stream_url, stream_name, viewer):
+        self.streams[stream_url] = viewer
+
+    def add_metadata_stream(self, stream_url, stream_name, viewer):
+        self.metadata_streams[stream_url] = viewer
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self.started.set()
+        print(f"Stopped  {self.__class__} {id(self)}")
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_server(self.handle, self.host, self.port, backlog=1024)
+        self.started.set()
+        async with server:
+            await self.stopping.wait()
+        # Let the clients finish their current frame
+        for pump in self.pumps.values():
+            pump.wake()
+        if self.tasks:
+            await asyncio.wait(self.tasks, timeout=1)
+
+    async def handle(self, reader, writer):
+        self.tasks.add(asyncio.current_task())
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode("latin-1").split()
+            url = urlsplit(parts[1]) if len(parts) > 1 else None
+            if url is not None and url.path in self.metadata_streams:
+                # e.g. /detections or /detections?format=ndjson
+                viewer = self.metadata_streams[url.path]
+                fmt = parse_qs(url.query).get("format", [viewer.format])[0]
+                await self.stream_metadata(viewer, fmt, writer)
+                return
+            viewer = self.streams.get(url.path) if url else None
+            if viewer is None:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+                return
+
+            # e.g. /stream?w=640&q=60
+            query = parse_qs(url.query)
+            width = int(query["w"][0]) if "w" in query else None
+            quality = int(query["q"][0]) if "q" in query else None
+            await self.stream(viewer, width, quality, writer)
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            self.tasks.discard(asyncio.current_task())
+
+    async def variant(self, viewer, width, quality):
+        """
+        Snap a requested width and quality to the closest variant of the viewer, so there is at most one pump per
+            variant however many different values clients request.
+
+        :return: The scale and quality of the variant and the width that selects it.
+        """
+        image, _ = viewer.get_latest()
+        if image is None and width is not None:
+            # The width of the variants is only known once there is a frame, the executor has a bounded number of
+            # threads
+            await self.loop.run_in_executor(None, viewer.broadcaster.get, 0, viewer.keepalive)
+            image, _ = viewer.get_latest()
+        if image is None:
+            # Still no frame, serve the default size
+            scale, quality = viewer.broadcaster.variant(None, None, quality)
+            return scale, quality, None
+        scale, quality = viewer.broadcaster.variant(image, width, quality)
+        return scale, quality, image.shape[1] // scale
+
+    async def stream(self, viewer, width, quality, writer):
+        scale, quality, width = await self.variant(viewer, width, quality)
+        key = (id(viewer), scale, quality)
+        if key not in self.pumps:
+            self.pumps[key] = StreamPump(self, viewer, width, quality)
+        pump = self.pumps[key]
+
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+                     b"Cache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+        self.clients += 1
+        pump.subscribe()
+        try:
+            tick = 0
+            sent_time = 0
+            while True:
+                if viewer.max_fps:
+                    await asyncio.sleep(max(sent_time + 1.0 / viewer.max_fps - time.time(), 0))
+                # A slow client skips to the latest frame
+                tick, jpg_frame = await pump.next(tick)
+                if jpg_frame is None:
+                    break
+                sent_time = time.time()
+                writer.write(b'--frame\r\nContent-Type: image/jpeg\r\n\r\n')
+                writer.write(jpg_frame)
+                writer.write(b'\r\n')
+                await writer.drain()
+        finally:
+            pump.unsubscribe()
+            self.clients -= 1
+
+    async def stream_metadata(self, viewer, fmt, writer):
+        key = ("metadata", id(viewer))
+        if key not in self.pumps:
+            self.pumps[key] = MetadataPump(self, viewer)
+        pump = self.pumps[key]
+
+        content_type = b"text/event-stream" if fmt == "sse" else b"application/x-ndjson"
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: " + content_type + b"\r\n"
+                     b"Cache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+        self.clients += 1
+        pump.subscribe()
+        try:
+            tick = 0
+            while True:
+                try:
+                    tick, payload = await asyncio.wait_for(pump.next(tick), viewer.keepalive)
+                except asyncio.TimeoutError:
+                    if fmt == "sse":
+                        writer.write(b": keepalive\n\n")
+                        await writer.drain()
+                    continue
+                if payload is None:
+                    break
+                writer.write(f"data: {payload}\n\n".encode() if fmt == "sse" else payload.encode() + b"\n")
+                await writer.drain()
+        finally:
+            pump.unsubscribe()
+            self.clients -= 1
+
+    def start(self, block: bool = False):
+        if not self.thread.is_alive():
+            print(f"Starting {self.__class__} {id(self)}")
+            self.thread.start()
+            self.started.wait()
+            print(f"Started {self.__class__} {id(self)}")
+        if block:
+            self.thread.join()
+
+    def stop(self):
+        print(f"Stopping {self.__class__} {id(self)}")
+        self.terminate = True
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+    def wait(self, timeout=3):
+        self.thread.join(timeout=timeout)
+        return self.thread.is_alive()
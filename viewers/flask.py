@@ -1,39 +1,134 @@
-from flask import Flask, Response
+from flask import Flask, Response, request
 import cv2
 from typing import Any, List
-from threading import Thread
+from threading import Thread, Lock, Condition
+from utils import as_captures
+import json
 import time
 
 
-class GetImage:
-    def __init__(self, viewer):
+class JpegBroadcaster:
+    def __init__(self, viewer: 'FlaskViewer', poll_interval=0.02, scales=(1, 2, 4), qualities=(95, 80, 60, 40)):
+        """
+        Encodes every new image of a FlaskViewer once per variant and shares the jpg bytes with all connected
+            clients. A client that is behind always receives the latest frame, intermediate frames are skipped.
+
+        :param viewer: The viewer to broadcast.
+        :param poll_interval: The interval in seconds at which a waiting client pulls the pipeline of the viewer
+            for a new frame (only if the viewer has a prev element).
+        :param scales: The downscale factors of the available variants, the first one is the default.
+        :param qualities: The jpg qualities of the available variants, the first one is the default.
+        """
         self.viewer = viewer
-        self.prev_result = None
+        self.poll_interval = poll_interval
+        self.scales = scales
+        self.qualities = qualities
+        self.lock = Lock()
+        self.variants = {}
+        self.encodes = 0
+        self.served = 0
+        self.start_time = time.time()
+
+    def variant(self, image, width=None, quality=None):
+        """
+        Snap a requested width and quality to the closest available variant.
+
+        :return: The scale and quality of the variant.
+        """
+        scale = self.scales[0]
+        if width is not None:
+            # The largest variant that is not wider than requested, or the smallest one
+            fitting = [s for s in self.scales if image.shape[1] // s <= width]
+            scale = min(fitting) if fitting else max(self.scales)
+        if quality is None:
+            quality = self.qualities[0]
+        else:
+            quality = min(self.qualities, key=lambda q: abs(q - quality))
+        return scale, quality
+
+    def encode(self, image, scale, quality):
+        if scale != 1:
+            h, w = image.shape[:2]
+            image = cv2.resize(image, (max(w // scale, 1), max(h // scale, 1)), interpolation=cv2.INTER_AREA)
+        success, a_numpy = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not success:
+            print("Missed frame (unable to encode jpg)")
+            return None
+        self.encodes += 1
+        return a_numpy.tobytes()
+
+    def get(self, version=0, timeout=None, width=None, quality=None):
+        """
+        Block until a frame newer than version is available.
 
-    def gen(self):
+        :param version: The version of the last frame the client received.
+        :param timeout: The maximum time to wait in seconds or None to wait forever.
+        :param width: The requested width, snapped to the closest variant (None for the default variant).
+        :param quality: The requested jpg quality, snapped to the closest variant (None for the default variant).
+        :return: The version and jpg bytes of the latest frame (None if there is no frame yet). The version equals
+            the given version if there was no new frame within timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
         while True:
-            frame = self.viewer.get_image()
-            # frame = np.random.uniform(0, 255, [100, 100, 3])
+            with self.lock:
+                if version >= self.viewer.version:
+                    # The client has seen the latest frame, pull the next one
+                    self.viewer.get_image()
+                image, image_version = self.viewer.get_latest()
+                jpg_version, jpg = 0, None
+                if image is not None:
+                    key = self.variant(image, width, quality)
+                    jpg_version, jpg = self.variants.get(key, (0, None))
+                    if jpg_version != image_version:
+                        # Resize and encode this variant of the frame once
+                        new_jpg = self.encode(image, *key)
+                        if new_jpg is not None:
+                            jpg_version, jpg = image_version, new_jpg
+                            self.variants[key] = (jpg_version, jpg)
+                expired = deadline is not None and time.time() >= deadline
+                if jpg_version > version or expired:
+                    if jpg is not None:
+                        self.served += 1
+                    return jpg_version, jpg
 
-            if frame is None:
-                print("Missed frame (buffer error)")
-                yield self.prev_result
+            # Wait for a push, or poll the pipeline of the viewer
+            wait_time = self.poll_interval if self.viewer.prev else None
+            if deadline is not None:
+                remaining = max(deadline - time.time(), 0)
+                wait_time = remaining if wait_time is None else min(wait_time, remaining)
+            self.viewer.wait_for_update(version, wait_time)
 
-            success, a_numpy = cv2.imencode('.jpg', frame)
-            if not success:
-                print("Missed frame (unable to decode jpg)")
-                yield self.prev_result
+    def stats(self):
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        return {"encodes": self.encodes, "served": self.served,
+                "encodes_per_second": self.encodes / elapsed, "served_per_second": self.served / elapsed}
 
-            jpg_frame = a_numpy.tostring()
 
-            result = (b'--frame\r\n' 
-                      b'Content-Type: image/jpeg\r\n\r\n' + jpg_frame + b'\r\n')
+class GetImage:
+    def __init__(self, viewer):
+        self.viewer = viewer
+
+    def gen(self, width=None, quality=None):
+        version = 0
+        sent_time = 0
+        while True:
+            if self.viewer.max_fps:
+                time.sleep(max(sent_time + 1.0 / self.viewer.max_fps - time.time(), 0))
+
+            # Returns the same frame again if there was no new frame within the keepalive interval
+            version, jpg_frame = self.viewer.broadcaster.get(version, timeout=self.viewer.keepalive,
+                                                             width=width, quality=quality)
+            if jpg_frame is None:
+                continue
+            sent_time = time.time()
 
-            self.prev_result = result
+            result = (b'--frame\r\n'
+                      b'Content-Type: image/jpeg\r\n\r\n' + jpg_frame + b'\r\n')
             yield result
 
     def __call__(self):
-        content = self.gen()
+        # e.g. /stream?w=640&q=60
+        content = self.gen(request.args.get("w", type=int), request.args.get("q", type=int))
         if content is not None:
             return Response(content, mimetype='multipart/x-mixed-replace; boundary=frame')
         else:
@@ -42,13 +137,34 @@ class GetImage:
 
 class FlaskViewer:
 
-    def __init__(self, server: 'FlaskServer', input_idx=-1, stream_url="/stream", stream_name="stream"):
+    def __init__(self, server: 'FlaskServer', input_idx=-1, stream_url="/stream", stream_name="stream",
+                 max_fps=None, keepalive=5.0, poll_interval=0.02, scales=(1, 2, 4), qualities=(95, 80, 60, 40)):
+        """
+        Streams an image of the captures as MJPEG. A stream only sends a frame when the image changed, which is the
+            case when the frame at input_idx is a different Frame object than the one that was shown last.
 
+        :param server: The FlaskServer (or AsyncStreamServer) to register the stream with.
+        :param input_idx: The index of the image in the captures.
+        :param stream_url: The url of the stream.
+        :param stream_name: The name of the stream endpoint.
+        :param max_fps: The maximum number of frames per second per client or None for no limit.
+        :param keepalive: Resend the last frame if there was no new frame for this number of seconds (None to never
+            resend).
+        :param poll_interval: The interval in seconds at which the pipeline is pulled while waiting for a new frame.
+        :param scales: The downscale factors a client can select with the w query parameter (e.g. /stream?w=640).
+        :param qualities: The jpg qualities a client can select with the q query parameter (e.g. /stream?q=60).
+        """
         self.server = server
-        self.server.app.add_url_rule(stream_url, stream_name, GetImage(self))
+        self.server.add_stream(stream_url, stream_name, self)
 
         self.input_idx = input_idx
+        self.max_fps = max_fps
+        self.keepalive = keepalive
         self.image = None
+        self.frame = None
+        self.version = 0
+        self.condition = Condition()
+        self.broadcaster = JpegBroadcaster(self, poll_interval, scales, qualities)
 
         self.prev = None
         self.next = None
@@ -56,8 +172,15 @@ class FlaskViewer:
     def __call__(self, captures: List[Any]) -> List[Any]:
         if self.prev:
             captures = self.prev([])
-        if captures[self.input_idx] is not None:
-            self.image = captures[self.input_idx].copy()
+        captures = as_captures(captures)
+        frame = captures.frame(self.input_idx)
+        if frame.image is not None and frame is not self.frame:
+            image = frame.image.copy()
+            with self.condition:
+                self.image = image
+                self.frame = frame
+                self.version += 1
+                self.condition.notify_all()
         return captures
 
     def get_image(self):
@@ -65,6 +188,139 @@ class FlaskViewer:
             self([])
         return self.image
 
+    def get_latest(self):
+        """
+        :return: The latest image and its version.
+        """
+        with self.condition:
+            return self.image, self.version
+
+    def wait_for_update(self, version=0, timeout=None) -> int:
+        """
+        Block until an image newer than version is available.
+
+        :return: The current version.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version > version, timeout)
+            return self.version
+
+    def start(self, block: bool = False):
+        self.server.start(block)
+
+    def stop(self):
+        self.server.stop()
+
+    def wait(self, timeout=3):
+        return self.server.wait(timeout)
+
+
+class GetMetadata:
+    def __init__(self, viewer):
+        self.viewer = viewer
+
+    def gen(self, fmt="sse"):
+        version = 0
+        while True:
+            version, payload = self.viewer.get(version, timeout=self.viewer.keepalive)
+            if payload is None:
+                if fmt == "sse":
+                    yield ": keepalive\n\n"
+                continue
+            if fmt == "sse":
+                yield f"data: {payload}\n\n"
+            else:
+                yield payload + "\n"
+
+    def __call__(self):
+        # e.g. /detections or /detections?format=ndjson
+        fmt = request.args.get("format", self.viewer.format)
+        if fmt == "sse":
+            return Response(self.gen(fmt), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+        return Response(self.gen(fmt), mimetype="application/x-ndjson")
+
+
+class MetadataViewer:
+
+    def __init__(self, server: 'FlaskServer', input_idx=-2, stream_url="/detections", stream_name="detections",
+                 format="sse", include_masks=True, keepalive=5.0, poll_interval=0.02):
+        """
+        Streams a metadata record of the captures (e.g. the Detections of Detectron2 or MMDetect with
+            output_detections=True) as Server-Sent Events or newline-delimited JSON. Each record is serialized once
+            together with the seq, timestamp and source of its frame and only sent when the frame changed.
+
+        :param server: The FlaskServer to register the stream with.
+        :param input_idx: The index of the record (a Detections or a dict) in the captures.
+        :param format: "sse" or "ndjson", a client can select the other with the format query parameter.
+        :param include_masks: Include the run-length encoded masks of Detections.
+        :param keepalive: Send an SSE comment if there was no new record for this number of seconds.
+        :param poll_interval: The interval in seconds at which the pipeline is pulled while waiting for a record.
+        """
+        self.server = server
+        self.server.add_metadata_stream(stream_url, stream_name, self)
+
+        self.input_idx = input_idx
+        self.format = format
+        self.include_masks = include_masks
+        self.keepalive = keepalive
+        self.poll_interval = poll_interval
+        self.payload = None
+        self.frame = None
+        self.version = 0
+        self.lock = Lock()
+        self.condition = Condition()
+
+        self.prev = None
+        self.next = None
+
+    def serialize(self, frame) -> str:
+        record = frame.image
+        if not isinstance(record, dict):
+            record = record.to_dict(masks=self.include_masks)
+        return json.dumps({"seq": frame.seq, "timestamp": frame.timestamp, "source": frame.source, **record},
+                          separators=(",", ":"), default=str)
+
+    def __call__(self, captures: List[Any]) -> List[Any]:
+        if self.prev:
+            captures = self.prev([])
+        captures = as_captures(captures)
+        frame = captures.frame(self.input_idx)
+        if frame.image is not None and not frame.stale and frame is not self.frame:
+            payload = self.serialize(frame)
+            with self.condition:
+                self.payload = payload
+                self.frame = frame
+                self.version += 1
+                self.condition.notify_all()
+        return captures
+
+    def get(self, version=0, timeout=None):
+        """
+        Block until a record newer than version is available.
+
+        :return: The version and serialized record of the latest frame. The record is None if there was no new
+            record within timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self.lock:
+                if version >= self.version and self.prev:
+                    # The client has seen the latest record, pull the next one
+                    self([])
+            with self.condition:
+                if self.version > version:
+                    return self.version, self.payload
+                if deadline is not None and time.time() >= deadline:
+                    return version, None
+
+            # Wait for a push, or poll the pipeline of the viewer
+            wait_time = self.poll_interval if self.prev else None
+            if deadline is not None:
+                remaining = max(deadline - time.time(), 0)
+                wait_time = remaining if wait_time is None else min(wait_time, remaining)
+            with self.condition:
+                self.condition.wait_for(lambda: self.version > version, wait_time)
+
     def start(self, block: bool = False):
         self.server.start(block)
 
@@ -87,6 +343,12 @@ class FlaskServer:
     def __call__(self, captures: List[Any]) -> List[Any]:
         return captures
 
+    def add_stream(self, stream_url, stream_name, viewer: FlaskViewer):
+        self.app.add_url_rule(stream_url, stream_name, GetImage(viewer))
+
+    def add_metadata_stream(self, stream_url, stream_name, viewer: MetadataViewer):
+        self.app.add_url_rule(stream_url, stream_name, GetMetadata(viewer))
+
     def start_flask(self):
         self.app.run(host='0.0.0.0', debug=False, use_reloader=False, port=self.port)
         print(f"Stopped  {self.__class__} {id(self)}")